@@ -0,0 +1,252 @@
+"""
+Trusted server running on an asyncio event loop, as an alternative to the Flask server of `server.py`.
+
+Every connection is served by its own coroutine, so a retrieval waiting for a message does not
+block the other clients. The routes, sessions and errors are the same as those of `server.py`:
+unknown sessions and participants are answered with 404, and malformed requests with 400. The
+HTTP/1.1 handling is done directly on asyncio streams, so that this server has no dependency
+beyond the standard library.
+"""
+
+import asyncio
+import functools
+import json
+import sys
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from session import DEFAULT_SESSION, MAX_WAIT, Session, Sessions
+from wire import encode_messages, encode_triplets
+
+
+# Maximum size in bytes of the body of a request
+MAX_BODY = 1 << 26
+
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 409: "Conflict", 411: "Length Required",
+    413: "Payload Too Large", 500: "Internal Server Error",
+}
+
+
+class AsyncServer:
+    """
+    Trusted server that serves the clients concurrently on an event loop.
+
+    Attributes:
+        sessions: Sessions of the server, with the messages of every pool ("private" and "public")
+            by channel, and the event of every channel, set once a message is pushed to it
+    """
+
+    def __init__(self, participants: List[str]):
+        self.sessions = Sessions(asyncio.Event)
+        self.sessions.register_default(participants)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serve the requests of a (keep-alive) connection.
+        """
+        try:
+            while True:
+                requestLine = await reader.readline()
+                if not requestLine:
+                    break
+                parts = requestLine.decode("latin-1").split()
+                if len(parts) != 3:
+                    await self.respond(writer, 400, "text/plain", b"Malformed request line")
+                    break
+                method, target, _ = parts
+                headers = dict()
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                error = self.check_length(headers)
+                if error is not None:
+                    # The body cannot be skipped, so the connection is closed after the response
+                    await self.respond(writer, *error)
+                    break
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                url = urlsplit(target)
+                path = [unquote(part) for part in url.path.split("/")[1:]]
+                query = {key: values[-1]
+                         for key, values in parse_qs(url.query).items()}
+                try:
+                    status, contentType, payload = await self.dispatch(method, path, query, body)
+                except (KeyError, TypeError, ValueError) as error:
+                    # Malformed parameters or body
+                    print(f"[ ERROR    ] {method} {url.path} / {error!r}")
+                    status, contentType, payload = 400, "text/plain", str(error).encode("utf-8")
+                except Exception as error:
+                    print(f"[ ERROR    ] {method} {url.path} / {error!r}")
+                    status, contentType, payload = 500, "text/plain", b""
+
+                await self.respond(writer, status, contentType, payload)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def check_length(self, headers: Dict[str, str]) -> Optional[Tuple[int, str, bytes]]:
+        """
+        Check the length of the body of a request, which must be given and at most `MAX_BODY`.
+
+        Returns:
+            Optional[Tuple[int, str, bytes]]: The error response, or None if the length is valid
+        """
+        if "transfer-encoding" in headers:
+            return 411, "text/plain", b"Chunked bodies are not supported, give a Content-Length"
+        length = headers.get("content-length", "0")
+        if not length.isdigit():
+            return 400, "text/plain", b"Malformed Content-Length"
+        if int(length) > MAX_BODY:
+            return 413, "text/plain", f"Bodies are limited to {MAX_BODY} bytes".encode("utf-8")
+        return None
+
+    async def respond(self, writer: asyncio.StreamWriter, status: int, contentType: str, payload: bytes) -> None:
+        """
+        Write a response.
+        """
+        writer.write((
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: {contentType}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            "\r\n"
+        ).encode("latin-1") + payload)
+        await writer.drain()
+
+    async def dispatch(self, method: str, path: List[str], query: Dict[str, str], body: bytes) -> Tuple[int, str, bytes]:
+        """
+        Route a request.
+
+        Returns:
+            Tuple[int, str, bytes]: The status code, content type and body of the response
+        """
+        binary = "application/octet-stream"
+        timeout = min(max(float(query.get("timeout", 0.0)), 0.0), MAX_WAIT)
+        sessionId = DEFAULT_SESSION
+        if path[:1] == ["sessions"] and len(path) >= 2:
+            sessionId, path = path[1], path[2:]
+            if not path and method == "POST":
+                participants = json.loads(body)["participants"]
+                if not await self.run_blocking(self.sessions.create, sessionId, participants):
+                    return 409, binary, b""
+                print(f"[ SESSION  ] {sessionId} / {len(participants)} PARTICIPANTS")
+                return 200, binary, b""
+        session = self.sessions.get(sessionId)
+        if session is None:
+            return 404, binary, b""
+        route = (method, path[0] if path else "", len(path))
+
+        if route == ("POST", "private", 4):
+            sender_id, receiver_id, label = path[1:]
+            print(
+                f"[ SEND     ] SENDER {sender_id} / LABEL {label} / RECEIVER {receiver_id}")
+            self.set_value(session, "private", (receiver_id, label), body)
+            return 200, binary, b""
+        if route == ("GET", "private", 3):
+            receiver_id, label = path[1:]
+            res = await self.get_value(session, "private", (receiver_id, label), receiver_id, timeout)
+            if res is not None:
+                print(f"[ RETRIEVE ] RECEIVER {receiver_id} / LABEL {label}")
+                return 200, binary, res
+            return 404, binary, b""
+        if route == ("POST", "public", 3):
+            sender_id, label = path[1:]
+            print(f"[ PUBLISH  ] SENDER {sender_id} / LABEL {label}")
+            self.set_value(session, "public", (sender_id, label), body)
+            return 200, binary, b""
+        if route == ("GET", "public", 4):
+            receiver_id, sender_id, label = path[1:]
+            res = await self.get_value(session, "public", (sender_id, label), receiver_id, timeout)
+            if res is not None:
+                print(
+                    f"[ RETRIEVE ] RECEIVER {receiver_id}. LABEL {label} / SENDER {sender_id}")
+                return 200, binary, res
+            return 404, binary, b""
+        if route == ("POST", "bulk", 3) and path[1] in ("private", "public"):
+            pool, receiver_id = path[1:]
+            request = json.loads(body)
+            if pool == "private":
+                channels = [(receiver_id, label) for label in request["labels"]]
+            else:
+                channels = [(sender_id, label)
+                            for sender_id, label in request["channels"]]
+            print(f"[ RETRIEVE ] RECEIVER {receiver_id} / {len(channels)} CHANNELS")
+            values = await self.get_values(session, pool, channels, receiver_id, request.get("timeout", 0.0))
+            return 200, binary, encode_messages(values)
+        if route[1] == "shares" and path[1:2] and path[1] not in session.participants:
+            return 404, binary, b""
+        # The generation of triplets may take a while, it must not block the other clients
+        if route == ("GET", "shares", 3):
+            client_id, op_id = path[1:]
+            shares = await self.run_blocking(session.ttp.retrieve_share, client_id, op_id)
+            return 200, binary, encode_triplets(*([share.value] for share in shares))
+        if route == ("GET", "shares", 4):
+            client_id, op_id, count = path[1:]
+            shares = await self.run_blocking(
+                session.ttp.retrieve_share_vectors, client_id, op_id, int(count))
+            return 200, binary, encode_triplets(*(share.values for share in shares))
+        return 404, binary, b""
+
+    async def run_blocking(self, function, *args):
+        """
+        Run a blocking function (e.g. generating triplets) in a thread, without blocking the event loop.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(function, *args))
+
+    def set_value(self, session: Session, pool: str, channel: Tuple[str, str], data: bytes) -> None:
+        """
+        Push data to a channel in a given pool and send an event.
+        """
+        session.store[pool].put(channel, data, session.readers(pool))
+
+    async def get_value(self, session: Session, pool: str, channel: Tuple[str, str], reader: str, timeout: float = 0.0) -> Optional[bytes]:
+        """
+        Subscribe to a channel in a given pool and get it once ready for a reader, waiting at
+        most `timeout` seconds.
+        """
+        store = session.store[pool]
+        value = store.get(channel, reader)
+        if value is None and timeout > 0:
+            try:
+                await asyncio.wait_for(store.event(channel).wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            value = store.get(channel, reader)
+        return value
+
+    async def get_values(self, session: Session, pool: str, channels: List[Tuple[str, str]], reader: str, timeout: float) -> List[Optional[bytes]]:
+        """
+        Get the values of several channels in a given pool, waiting at most `timeout` seconds
+        for all of them. Missing values are None.
+        """
+        timeout = min(max(float(timeout), 0.0), MAX_WAIT)
+        return list(await asyncio.gather(*(self.get_value(session, pool, channel, reader, timeout) for channel in channels)))
+
+
+def run(host: str, port: int, participants: List[str]) -> None:
+    """
+    Register the participants, then run the server.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server = AsyncServer(participants)
+    loop.run_until_complete(asyncio.start_server(
+        server.handle_connection, host, port))
+    loop.run_forever()
+
+
+def main(args: List[str]) -> None:
+    """
+    Entrypoint of the program.
+    """
+    run("localhost", 5000, args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,328 @@
+"""
+Flat arithmetic circuit representation of an expression.
+
+Example:
+>>> alice_secret = Secret()
+>>> bob_secret = Secret()
+>>> circuit = compile_expression(alice_secret * bob_secret + alice_secret * bob_secret)
+>>> len(circuit)  # The common subexpression is stored only once
+4
+
+The gates are stored in topological order in parallel arrays, so that evaluating the
+circuit is a single loop over them.
+"""
+
+from array import array
+from typing import Dict, List, Tuple
+
+from expression import (
+    Add, Expression, Mult, Scalar,
+    Secret, Sub
+)
+from secret_sharing import MODULUS
+
+# Gate opcodes
+OP_SECRET = 0
+OP_SCALAR = 1
+OP_ADD = 2
+OP_SUB = 3
+OP_MULT = 4
+
+
+class Circuit:
+    """
+    An arithmetic circuit whose gates are stored in topological order.
+
+    Attributes:
+        ops: Opcode of each gate
+        left: Index of the left operand of each gate. For `OP_SECRET` gates, the index of
+            the secret in `secrets`, and for `OP_SCALAR` gates, the index of the value in `constants`.
+        right: Index of the right operand of each gate (-1 for leaves)
+        public: Whether the value of each gate is public (does not depend on a secret)
+        depth: Multiplicative depth of each gate, i.e. the number of multiplication rounds
+            needed before its value is known
+        secrets: IDs of the secrets of the circuit
+        constants: Values of the scalars of the circuit
+        output: Index of the gate computing the value of the expression
+    """
+
+    def __init__(self):
+        self.ops = array("b")
+        self.left = array("l")
+        self.right = array("l")
+        self.public = array("b")
+        self.depth = array("l")
+        self.secrets: List[bytes] = list()
+        self.constants: List[int] = list()
+        self.output = -1
+        # *gateDict maps the structural key of every gate to its index (hash-consing)
+        self.gateDict: Dict[Tuple, int] = dict()
+
+    def __len__(self):
+        return len(self.ops)
+
+    def add_gate(self, op: int, left: int, right: int = -1) -> int:
+        """Add a gate unless a structurally identical one exists, and return its index."""
+        if op == OP_ADD or op == OP_MULT:
+            # Commutative gates are identified regardless of the order of their operands
+            key = (op, min(left, right), max(left, right))
+        else:
+            key = (op, left, right)
+        index = self.gateDict.get(key)
+        if index is not None:
+            return index
+
+        if op == OP_SECRET:
+            public, depth = False, 0
+        elif op == OP_SCALAR:
+            public, depth = True, 0
+        else:
+            public = self.public[left] and self.public[right]
+            depth = max(self.depth[left], self.depth[right])
+            if op == OP_MULT and not self.public[left] and not self.public[right]:
+                depth += 1
+
+        index = len(self.ops)
+        self.ops.append(op)
+        self.left.append(left)
+        self.right.append(right)
+        self.public.append(public)
+        self.depth.append(depth)
+        self.gateDict[key] = index
+        return index
+
+    def add_secret(self, secret_id: bytes) -> int:
+        """Add an input gate for the secret with the given ID."""
+        index = self.gateDict.get((OP_SECRET, secret_id))
+        if index is None:
+            index = self.add_gate(OP_SECRET, len(self.secrets))
+            self.gateDict[(OP_SECRET, secret_id)] = index
+            self.secrets.append(secret_id)
+        return index
+
+    def add_scalar(self, value: int) -> int:
+        """Add a gate for a public scalar value."""
+        index = self.gateDict.get((OP_SCALAR, value))
+        if index is None:
+            index = self.add_gate(OP_SCALAR, len(self.constants))
+            self.gateDict[(OP_SCALAR, value)] = index
+            self.constants.append(value)
+        return index
+
+    def is_secret_mult(self, index: int) -> bool:
+        """Whether the gate is a multiplication of two secret operands (a Beaver multiplication)."""
+        return self.ops[index] == OP_MULT and not self.public[self.left[index]] \
+            and not self.public[self.right[index]]
+
+    def schedule(self) -> List[Tuple[List[int], List[int]]]:
+        """Split the gates into levels of multiplicative depth.
+
+        The gates of a level are the Beaver multiplications that can be opened together
+        in one round, followed by the local gates that only need their results.
+
+        Returns:
+            List[Tuple[List[int], List[int]]]: (multiplication gates, local gates) of each level
+        """
+        maxDepth = max(self.depth) if len(self) else 0
+        levels: List[Tuple[List[int], List[int]]] = [
+            (list(), list()) for _ in range(maxDepth + 1)
+        ]
+        for index in range(len(self)):
+            if self.is_secret_mult(index):
+                levels[self.depth[index]][0].append(index)
+            else:
+                levels[self.depth[index]][1].append(index)
+        return levels
+
+
+def compile_expression(expr: Expression) -> Circuit:
+    """Lower an expression into a circuit, deduplicating identical subexpressions.
+
+    The expression is traversed with an explicit stack, so arbitrarily deep expressions
+    (e.g. long chains built with `*=`) do not hit the recursion limit.
+    """
+    circuit = Circuit()
+    # *nodeDict maps the already compiled nodes (by object identity) to their gates
+    nodeDict: Dict[int, int] = dict()
+    # Post-order traversal: a node is lowered once both its operands are
+    stack: List[Tuple[Expression, bool]] = [(expr, False)]
+    while stack:
+        node, operandsLowered = stack.pop()
+        if id(node) in nodeDict:
+            continue
+        if isinstance(node, Secret):
+            nodeDict[id(node)] = circuit.add_secret(node.id)
+        elif isinstance(node, Scalar):
+            nodeDict[id(node)] = circuit.add_scalar(node.value)
+        elif isinstance(node, (Add, Sub, Mult)):
+            if operandsLowered:
+                if isinstance(node, Add):
+                    op = OP_ADD
+                elif isinstance(node, Sub):
+                    op = OP_SUB
+                else:
+                    op = OP_MULT
+                nodeDict[id(node)] = circuit.add_gate(
+                    op, nodeDict[id(node.leftExpression)], nodeDict[id(node.rightExpression)])
+            else:
+                stack.append((node, True))
+                stack.append((node.rightExpression, False))
+                stack.append((node.leftExpression, False))
+        else:
+            raise Exception(
+                "Expression not recognized. Are you sure the input is correct?")
+
+    circuit.output = nodeDict[id(expr)]
+    return circuit
+
+
+class LinearForm:
+    """
+    An affine combination `constant + sum(coefficients[i] * wire[wires[i]])` of wires.
+
+    Attributes:
+        wires: Indices of the wires with a non-zero coefficient
+        coefficients: Public coefficients of the wires
+        constant: Public constant term
+    """
+
+    def __init__(self, wires: List[int], coefficients: List[int], constant: int):
+        self.wires = wires
+        self.coefficients = coefficients
+        self.constant = constant
+
+    def __repr__(self):
+        terms = [f"{c}*w{w}" for w, c in zip(self.wires, self.coefficients)]
+        return " + ".join(terms + [str(self.constant)])
+
+
+class LinearCircuit:
+    """
+    A circuit where all the local gates are collapsed into linear forms over wires.
+
+    The wires are the secrets, numbered in the order of `secrets`, followed by the results of
+    the Beaver multiplications, numbered level by level.
+
+    Attributes:
+        secrets: IDs of the secrets of the circuit
+        levels: Beaver multiplications of each level, as the linear forms of their two operands
+        output: Linear form of the value of the expression
+    """
+
+    def __init__(
+        self,
+        secrets: List[bytes],
+        levels: List[List[Tuple[LinearForm, LinearForm]]],
+        output: LinearForm
+    ):
+        self.secrets = secrets
+        self.levels = levels
+        self.output = output
+
+
+def linearize(circuit: Circuit) -> LinearCircuit:
+    """Collapse the local gates of a circuit into linear forms.
+
+    Sums, differences and multiplications by public values only scale and add their operands,
+    so each operand of a Beaver multiplication, and the output, is an affine combination of the
+    secrets and of the results of lower-level multiplications.
+    """
+    ops, left, right, public = circuit.ops, circuit.left, circuit.right, circuit.public
+    # Public values are known to everyone: compute them once
+    publicValues = [0] * len(circuit)
+    for index in range(len(circuit)):
+        if not public[index]:
+            continue
+        op = ops[index]
+        if op == OP_SCALAR:
+            publicValues[index] = circuit.constants[left[index]] % MODULUS
+        elif op == OP_ADD:
+            publicValues[index] = (
+                publicValues[left[index]] + publicValues[right[index]]) % MODULUS
+        elif op == OP_SUB:
+            publicValues[index] = (
+                publicValues[left[index]] - publicValues[right[index]]) % MODULUS
+        else:
+            publicValues[index] = (
+                publicValues[left[index]] * publicValues[right[index]]) % MODULUS
+
+    # *wireDict maps the gates that are wires to their wire index
+    wireDict: Dict[int, int] = dict()
+    for index in range(len(circuit)):
+        if ops[index] == OP_SECRET:
+            wireDict[index] = left[index]
+    schedule = [mults for mults, _ in circuit.schedule()]
+    for mults in schedule:
+        for index in mults:
+            wireDict[index] = len(wireDict)
+
+    # Count the uses of every gate: the linear form of a gate used once can be extended in place
+    uses = [0] * len(circuit)
+    for index in range(len(circuit)):
+        if ops[index] != OP_SECRET and ops[index] != OP_SCALAR:
+            uses[left[index]] += 1
+            uses[right[index]] += 1
+
+    # *forms maps the local secret gates to their linear form, as sparse coefficients by wire
+    # and a constant. They are computed once, in topological order.
+    forms: Dict[int, Tuple[Dict[int, int], int]] = dict()
+
+    def form(index: int, owned: bool = False) -> Tuple[Dict[int, int], int]:
+        """The form of a gate. If `owned`, its coefficients can be modified by the caller."""
+        if public[index]:
+            return dict(), publicValues[index]
+        if index in wireDict:
+            return {wireDict[index]: 1}, 0
+        coefficients, constant = forms[index]
+        if owned and uses[index] > 1:
+            coefficients = dict(coefficients)
+        return coefficients, constant
+
+    def size(index: int) -> int:
+        return len(forms[index][0]) if index in forms else 1
+
+    for index in range(len(circuit)):
+        if public[index] or index in wireDict:
+            continue
+        op, leftIndex, rightIndex = ops[index], left[index], right[index]
+        if op == OP_MULT:
+            # One of the operands is public
+            if public[leftIndex]:
+                scale, operand = publicValues[leftIndex], rightIndex
+            else:
+                scale, operand = publicValues[rightIndex], leftIndex
+            coefficients, constant = form(operand, owned=True)
+            for wire, coefficient in coefficients.items():
+                coefficients[wire] = coefficient * scale % MODULUS
+            forms[index] = (coefficients, constant * scale % MODULUS)
+            continue
+        sign = 1 if op == OP_ADD else -1
+        if op == OP_ADD and size(rightIndex) > size(leftIndex):
+            # Extend the larger form with the smaller one
+            leftIndex, rightIndex = rightIndex, leftIndex
+        coefficients, constant = form(leftIndex, owned=True)
+        otherCoefficients, otherConstant = form(rightIndex)
+        for wire, coefficient in otherCoefficients.items():
+            coefficients[wire] = (coefficients.get(wire, 0) + sign * coefficient) % MODULUS
+        forms[index] = (coefficients, (constant + sign * otherConstant) % MODULUS)
+
+    # *linearForms caches the forms of the gates used by several multiplications
+    linearForms: Dict[int, LinearForm] = dict()
+
+    def linear_form(root: int) -> LinearForm:
+        if root not in linearForms:
+            coefficients, constant = form(root)
+            wires = sorted(wire for wire, coefficient in coefficients.items()
+                           if coefficient % MODULUS != 0)
+            linearForms[root] = LinearForm(
+                wires,
+                [coefficients[wire] % MODULUS for wire in wires],
+                constant % MODULUS
+            )
+        return linearForms[root]
+
+    levels = [
+        [(linear_form(left[index]), linear_form(right[index])) for index in mults]
+        for mults in schedule
+    ]
+    return LinearCircuit(list(circuit.secrets), levels, linear_form(circuit.output))
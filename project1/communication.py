@@ -1,13 +1,26 @@
 """
 Utilities for client communication with the trusted server.
 You should not need to change this file.
+
+`AsyncCommunication` offers the same methods as coroutines, to issue several requests
+concurrently. `Transport` is the interface of the communications of a client, which the
+loopback and stream transports implement too.
 """
 
-import json
+import asyncio
+import functools
+import itertools
 import time
-from typing import Union, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Protocol, Union, Tuple
 
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import Metrics
+from wire import decode_messages, decode_triplets
 
 
 def sanitize_url_param(url_param: Union[bytes, str]) -> str:
@@ -24,6 +37,47 @@ def sanitize_url_param(url_param: Union[bytes, str]) -> str:
     return url_param.replace("/", "_").replace("+", "-")  # type: ignore
 
 
+def _header_bytes(headers) -> bytes:
+    """
+    The bytes of HTTP headers on the wire, with the blank line ending them.
+    """
+    return "".join(f"{name}: {value}\r\n" for name, value in headers.items()).encode("latin-1") + b"\r\n"
+
+
+class Transport(Protocol):
+    """
+    Communications of a client with the other clients and the trusted parameter generator, e.g.
+    a `Communication`, a `stream.StreamCommunication` or a `loopback.LoopbackCommunication`.
+
+    Attributes:
+        metrics: metrics recording every request
+        pool_size: number of requests `AsyncCommunication` may make concurrently
+    """
+
+    metrics: Metrics
+    pool_size: int
+
+    def close(self) -> None: ...
+
+    def create_session(self, participants: List[str]) -> None: ...
+
+    def send_private_message(self, receiver_id: str, label: str, message: Union[bytes, str]) -> None: ...
+
+    def retrieve_private_message(self, label: str) -> bytes: ...
+
+    def retrieve_private_messages(self, labels: List[str]) -> List[bytes]: ...
+
+    def publish_message(self, label: str, message: Union[bytes, str]) -> None: ...
+
+    def retrieve_public_message(self, sender_id: str, label: str) -> bytes: ...
+
+    def retrieve_public_messages(self, channels: List[Tuple[str, str]]) -> List[bytes]: ...
+
+    def retrieve_beaver_triplet_shares(self, op_id: str) -> Tuple[int, int, int]: ...
+
+    def retrieve_beaver_triplet_vectors(self, op_id: str, count: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]: ...
+
+
 class Communication:
     """
     Network communications with the server.
@@ -34,6 +88,13 @@ class Communication:
         client_id: Identifier of this client
         poll_delay: delay between requests in seconds (default: 0.2 s)
         protocol: network protocol to use (default: "http")
+        wait_timeout: time in seconds the server holds a retrieval until the message is
+            available (default: 10 s). If 0, retrievals are polled every `poll_delay` seconds.
+        pool_size: number of persistent connections kept open to the server (default: 10)
+        max_retries: number of retries of a request when connecting fails (default: 3)
+        session_id: session of the computation on the server (default: the default session,
+            whose participants are given when the server starts)
+        metrics: metrics recording every request (default: new metrics)
     """
 
     def __init__(
@@ -42,11 +103,78 @@ class Communication:
             server_port: int,
             client_id: str,
             poll_delay: float = 0.2,
-            protocol: str = "http"
+            protocol: str = "http",
+            wait_timeout: float = 10.0,
+            pool_size: int = 10,
+            max_retries: int = 3,
+            session_id: Optional[str] = None,
+            metrics: Optional[Metrics] = None
     ):
         self.base_url = f"{protocol}://{server_host}:{server_port}"
+        if session_id is not None:
+            self.base_url += f"/sessions/{sanitize_url_param(session_id)}"
         self.client_id = client_id
+        self.session_id = session_id
         self.poll_delay = poll_delay
+        self.wait_timeout = wait_timeout
+        self.pool_size = pool_size
+
+        # Keep-alive connections are reused for all the requests of this client.
+        # Only the requests that did not reach the server are retried, whatever their method: a
+        # retrieval whose response is lost may have consumed its messages, which the server drops
+        # once all their readers fetched them, so repeating it would wait forever.
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            backoff_factor=0.1,
+            allowed_methods=None,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount(f"{protocol}://", adapter)
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.session.hooks["response"].append(self._record_response)
+
+    def _record_response(self, res: requests.Response, *args, **kwargs) -> None:
+        """
+        Record the bytes exchanged by a request in the metrics.
+        """
+        request = res.request
+        body = request.body or b""
+        requestHeaders = f"{request.method} {request.path_url} HTTP/1.1\r\n".encode("latin-1") + \
+            _header_bytes(request.headers)
+        responseHeaders = f"HTTP/1.1 {res.status_code} {res.reason}\r\n".encode("latin-1") + \
+            _header_bytes(res.headers)
+        self.metrics.record_request(
+            payload_sent=len(body.encode("utf-8") if isinstance(body, str) else body),
+            payload_received=len(res.content),
+            header_sent=len(requestHeaders),
+            header_received=len(responseHeaders)
+        )
+
+    def close(self) -> None:
+        """
+        Close the connections to the server.
+        """
+        self.session.close()
+
+    def create_session(self, participants: List[str]) -> None:
+        """
+        Create the session of this client on the server, with the given participants. Every
+        participant can create the session, it is only created once.
+        """
+        if self.session_id is None:
+            raise ValueError("The default session cannot be created")
+        print(f"POST {self.base_url}")
+        res = self.session.post(self.base_url, json={
+                                "participants": list(participants)})
+        res.raise_for_status()
 
     def send_private_message(
         self,
@@ -64,7 +192,7 @@ class Communication:
 
         url = f"{self.base_url}/private/{client_id_san}/{receiver_id_san}/{label_san}"
         print(f"POST {url}")
-        requests.post(url, message)
+        self.session.post(url, message)
 
     def retrieve_private_message(
         self,
@@ -78,14 +206,30 @@ class Communication:
         label_san = sanitize_url_param(label)
 
         url = f"{self.base_url}/private/{client_id_san}/{label_san}"
-        # We can either use a websocket, or do some polling, but websockets would require asyncio.
-        # So we are doing polling to avoid introducing a new programming paradigm.
-        while True:
+        return self._wait_for_message(url)
+
+    def _wait_for_message(self, url: str) -> bytes:
+        """
+        Retrieve a message from the server, waiting until it is available.
+        """
+        # The server holds the request until the message is available (long polling), and we
+        # only poll again when the wait times out. Without long polling, we poll every `poll_delay`.
+        for attempt in itertools.count():
+            if attempt:
+                self.metrics.record_poll_retry()
             print(f"GET  {url}")
-            res = requests.get(url)
+            if self.wait_timeout > 0:
+                res = self.session.get(
+                    url,
+                    params={"timeout": self.wait_timeout},
+                    timeout=self.wait_timeout + 5
+                )
+            else:
+                res = self.session.get(url)
             if res.status_code == 200:
                 return res.content
-            time.sleep(self.poll_delay)
+            if self.wait_timeout <= 0:
+                time.sleep(self.poll_delay)
 
     def publish_message(
         self,
@@ -101,7 +245,7 @@ class Communication:
 
         url = f"{self.base_url}/public/{client_id_san}/{label_san}"
         print(f"POST {url}")
-        requests.post(url, message)
+        self.session.post(url, message)
 
     def retrieve_public_message(
         self,
@@ -117,15 +261,65 @@ class Communication:
         label_san = sanitize_url_param(label)
 
         url = f"{self.base_url}/public/{client_id_san}/{sender_id_san}/{label_san}"
+        return self._wait_for_message(url)
 
-        # We can either use a websocket, or do some polling, but websockets would require asyncio.
-        # So we are doing polling to avoid introducing a new programming paradigm.
-        while True:
-            print(f"GET  {url}")
-            res = requests.get(url)
-            if res.status_code == 200:
-                return res.content
-            time.sleep(self.poll_delay)
+    def retrieve_private_messages(
+        self,
+        labels: List[str]
+    ) -> List[bytes]:
+        """
+        Retrieve several private messages from the server in one request, waiting until all
+        of them are available.
+        """
+
+        client_id_san = sanitize_url_param(self.client_id)
+        labels_san = [sanitize_url_param(label) for label in labels]
+
+        url = f"{self.base_url}/bulk/private/{client_id_san}"
+        return self._wait_for_messages(url, "labels", labels_san)
+
+    def retrieve_public_messages(
+        self,
+        channels: List[Tuple[str, str]]
+    ) -> List[bytes]:
+        """
+        Retrieve several public messages, given as (sender_id, label) pairs, from the server in
+        one request, waiting until all of them are available.
+        """
+
+        client_id_san = sanitize_url_param(self.client_id)
+        channels_san = [
+            [sanitize_url_param(sender_id), sanitize_url_param(label)]
+            for sender_id, label in channels
+        ]
+
+        url = f"{self.base_url}/bulk/public/{client_id_san}"
+        return self._wait_for_messages(url, "channels", channels_san)
+
+    def _wait_for_messages(self, url: str, key: str, channels: list) -> List[bytes]:
+        """
+        Retrieve several messages from a bulk route, waiting until all of them are available.
+        Only the missing messages are requested again.
+        """
+        messages: List[Optional[bytes]] = [None] * len(channels)
+        for attempt in itertools.count():
+            missing = [i for i, message in enumerate(messages) if message is None]
+            if not missing:
+                return messages  # type: ignore
+            if attempt:
+                self.metrics.record_poll_retry()
+            print(f"POST {url}")
+            res = self.session.post(
+                url,
+                json={key: [channels[i] for i in missing],
+                      "timeout": self.wait_timeout},
+                timeout=self.wait_timeout + 5
+            )
+            res.raise_for_status()
+            for i, value in zip(missing, decode_messages(res.content)):
+                messages[i] = value
+            if self.wait_timeout <= 0 and None in messages:
+                time.sleep(self.poll_delay)
 
     def retrieve_beaver_triplet_shares(
         self,
@@ -141,5 +335,135 @@ class Communication:
         url = f"{self.base_url}/shares/{client_id_san}/{op_id_san}"
         print(f"GET  {url}")
 
-        res = requests.get(url)
-        return tuple(json.loads(res.text))  # type: ignore
+        res = self.session.get(url)
+        res.raise_for_status()
+        return tuple(int(share[0]) for share in decode_triplets(res.content))  # type: ignore
+
+    def retrieve_beaver_triplet_vectors(
+        self,
+        op_id: str,
+        count: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Retrieve the shares of `count` triplets generated by the trusted server, as vectors (a, b, c).
+        """
+
+        client_id_san = sanitize_url_param(self.client_id)
+        op_id_san = sanitize_url_param(op_id)
+
+        url = f"{self.base_url}/shares/{client_id_san}/{op_id_san}/{count}"
+        print(f"GET  {url}")
+
+        res = self.session.get(url)
+        res.raise_for_status()
+        return decode_triplets(res.content)
+
+
+class AsyncCommunication:
+    """
+    Asynchronous network communications with the server.
+
+    The requests are made by a `Communication` in a pool of threads, so that the coroutines
+    of several requests (e.g. to every client of a round) can be awaited together.
+
+    Attributes:
+        comm: Communications making the requests (e.g. a `Communication`)
+        max_workers: maximum number of concurrent requests (default: the pool size of `comm`)
+    """
+
+    def __init__(
+            self,
+            comm: Transport,
+            max_workers: Optional[int] = None
+    ):
+        self.comm = comm
+        self.executor = ThreadPoolExecutor(
+            max_workers or comm.pool_size)
+
+    async def _call(self, method, *args):
+        """
+        Run a method of the communication in the pool of threads.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(method, *args))
+
+    async def send_private_message(
+        self,
+        receiver_id: str,
+        label: str,
+        message: Union[bytes, str]
+    ) -> None:
+        """
+        Send a private message to the server.
+        """
+        await self._call(self.comm.send_private_message, receiver_id, label, message)
+
+    async def retrieve_private_message(
+        self,
+        label: str
+    ) -> bytes:
+        """
+        Retrieve a private message from the server.
+        """
+        return await self._call(self.comm.retrieve_private_message, label)
+
+    async def retrieve_private_messages(
+        self,
+        labels: List[str]
+    ) -> List[bytes]:
+        """
+        Retrieve several private messages from the server in one request.
+        """
+        return await self._call(self.comm.retrieve_private_messages, labels)
+
+    async def publish_message(
+        self,
+        label: str,
+        message: Union[bytes, str]
+    ) -> None:
+        """
+        Publish a message on the server.
+        """
+        await self._call(self.comm.publish_message, label, message)
+
+    async def retrieve_public_message(
+        self,
+        sender_id: str,
+        label: str
+    ) -> bytes:
+        """
+        Retrieve a public message from the server.
+        """
+        return await self._call(self.comm.retrieve_public_message, sender_id, label)
+
+    async def retrieve_public_messages(
+        self,
+        channels: List[Tuple[str, str]]
+    ) -> List[bytes]:
+        """
+        Retrieve several public messages, given as (sender_id, label) pairs, from the server in
+        one request.
+        """
+        return await self._call(self.comm.retrieve_public_messages, channels)
+
+    async def create_session(self, participants: List[str]) -> None:
+        """
+        Create the session of this client on the server, with the given participants.
+        """
+        await self._call(self.comm.create_session, participants)
+
+    async def retrieve_beaver_triplet_vectors(
+        self,
+        op_id: str,
+        count: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Retrieve the shares of `count` triplets generated by the trusted server, as vectors (a, b, c).
+        """
+        return await self._call(self.comm.retrieve_beaver_triplet_vectors, op_id, count)
+
+    def close(self) -> None:
+        """
+        Stop the pool of threads.
+        """
+        self.executor.shutdown(wait=False)
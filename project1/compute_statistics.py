@@ -1,39 +1,194 @@
+"""
+Statistics of the metrics of the clients, e.g. of the benchmarks.
+
+The metrics are read from any number of files, either exports of `Metrics.to_json` (one line
+of JSON per client and computation, e.g. `metrics.jsonl`) or legacy files of lines
+`<time> <bytes received> <bytes sent>`.
+
+Usage:
+    python3 compute_statistics.py metrics.jsonl
+    python3 compute_statistics.py Alice.txt Bob.txt
+    python3 compute_statistics.py metrics.jsonl --group-by benchmark
+    python3 compute_statistics.py metrics.jsonl --compare baseline.jsonl
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, List, Optional
+
 import numpy as np
-computationTime = list()
-bytesReceived = list()
-bytesSent = list()
-
-with open("Alice.txt", "r") as a:
-    for line in a:
-        lineText = line.split(" ")
-        computationTime.append(float(lineText[1]))
-        bytesReceived.append(int(lineText[2]))
-        bytesSent.append(int(lineText[3]))
-with open("Bob.txt", "r") as b:
-    for line in b:
-        lineText = line.split(" ")
-        computationTime.append(float(lineText[1]))
-        bytesReceived.append(int(lineText[2]))
-        bytesSent.append(int(lineText[3]))
-
-print("Computational cost:")
-print("Max:", np.max(computationTime))
-print("Min:", np.min(computationTime))
-print("Mean:", np.mean(computationTime).round(2))
-print("Median:", np.median(computationTime))
-print("Std:", np.std(computationTime).round(2))
-print()
-print("Received bytes:")
-print("Max:", np.max(bytesReceived))
-print("Min:", np.min(bytesReceived))
-print("Mean:", np.mean(bytesReceived).round(2))
-print("Median:", np.median(bytesReceived))
-print("Std:", np.std(bytesReceived).round(2))
-print()
-print("Sent bytes:")
-print("Max:", np.max(bytesSent))
-print("Min:", np.min(bytesSent))
-print("Mean:", np.mean(bytesSent).round(2))
-print("Median:", np.median(bytesSent))
-print("Std:", np.std(bytesSent).round(2))
-print()
+
+from metrics import COUNTERS
+
+PERCENTILES = (50, 95, 99)
+# Counters of the legacy text files, by column
+LEGACY_COLUMNS = ("wall_time", "payload_received", "payload_sent")
+BYTE_COUNTERS = ("payload_sent", "payload_received", "header_sent", "header_received")
+
+
+class Samples:
+    """
+    Metrics of many computations, one row per client and computation.
+
+    Attributes:
+        labels: Labels of every row
+        totals: Total time ("wall_time") and counters of every row
+        phases: Time and counters of every row, by phase (0 where a row has no such phase)
+    """
+
+    def __init__(self, labels: List[Dict[str, str]], totals: Dict[str, np.ndarray], phases: Dict[str, Dict[str, np.ndarray]]):
+        self.labels = labels
+        self.totals = totals
+        self.phases = phases
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def select(self, rows: np.ndarray) -> "Samples":
+        """The samples of some rows, given by their indices."""
+        return Samples(
+            [self.labels[row] for row in rows],
+            {name: values[rows] for name, values in self.totals.items()},
+            {phase: {name: values[rows] for name, values in counters.items()}
+             for phase, counters in self.phases.items()},
+        )
+
+    def groups(self, label: Optional[str]) -> Dict[str, "Samples"]:
+        """Split the samples by the value of a label (all the samples if None)."""
+        if label is None:
+            return {"all": self}
+        keys = np.array([labels.get(label, "") for labels in self.labels])
+        return {key: self.select(np.flatnonzero(keys == key)) for key in dict.fromkeys(keys)}
+
+
+def _load_json(lines: List[str]) -> Samples:
+    records = [json.loads(line) for line in lines if line.strip()]
+    fields = ["wall_time", *COUNTERS]
+    totals = {name: np.fromiter((record["totals"][name] for record in records), dtype=float, count=len(records))
+              for name in fields}
+    phaseNames = dict.fromkeys(phase for record in records for phase in record["phases"])
+    phases = {
+        phase: {name: np.fromiter((record["phases"].get(phase, dict()).get(name, 0) for record in records),
+                                  dtype=float, count=len(records))
+                for name in fields}
+        for phase in phaseNames
+    }
+    return Samples([record["labels"] for record in records], totals, phases)
+
+
+def _load_text(path: str) -> Samples:
+    columns = np.loadtxt(path, ndmin=2)
+    totals = {name: np.zeros(len(columns)) for name in ["wall_time", *COUNTERS]}
+    totals.update({name: columns[:, i] for i, name in enumerate(LEGACY_COLUMNS)})
+    # The client of a legacy file is its name, e.g. Alice.txt
+    client = path.rsplit("/", 1)[-1].split(".")[0]
+    return Samples([{"client": client}] * len(columns), totals, dict())
+
+
+def load(paths: List[str]) -> Samples:
+    """Load and concatenate the metrics of several files."""
+    parts = list()
+    for path in paths:
+        with open(path, "r") as f:
+            firstLine = f.readline()
+            if firstLine.lstrip().startswith("{"):
+                parts.append(_load_json([firstLine] + f.readlines()))
+                continue
+        parts.append(_load_text(path))
+    return concatenate(parts)
+
+
+def concatenate(parts: List[Samples]) -> Samples:
+    names = list(dict.fromkeys(name for part in parts for name in part.totals))
+    phaseNames = list(dict.fromkeys(phase for part in parts for phase in part.phases))
+
+    def column(values: List[Optional[np.ndarray]]) -> np.ndarray:
+        return np.concatenate([np.zeros(len(part)) if value is None else value
+                               for part, value in zip(parts, values)] or [np.zeros(0)])
+
+    return Samples(
+        [labels for part in parts for labels in part.labels],
+        {name: column([part.totals.get(name) for part in parts]) for name in names},
+        {phase: {name: column([part.phases.get(phase, dict()).get(name) for part in parts])
+                 for name in names}
+         for phase in phaseNames},
+    )
+
+
+def summarize(values: np.ndarray) -> Dict[str, float]:
+    """Distribution of values: count, min, mean, std, percentiles and max."""
+    if len(values) == 0:
+        return {"count": 0}
+    summary = {"count": len(values), "min": values.min(), "mean": values.mean(), "std": values.std()}
+    summary.update({f"p{p}": value for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES))})
+    summary["max"] = values.max()
+    return summary
+
+
+def _format(value: float) -> str:
+    return f"{value:.4g}" if abs(value) < 1e4 else f"{value:.0f}"
+
+
+def _print_summary(name: str, summary: Dict[str, float]) -> None:
+    print(f"  {name:<18}" + "  ".join(f"{key}={_format(value)}" for key, value in summary.items()))
+
+
+def report(samples: Samples) -> None:
+    """Print the distributions of the time and the bytes, and the mean bytes of every phase."""
+    print(f"{len(samples)} samples")
+    _print_summary("wall_time (s)", summarize(samples.totals["wall_time"]))
+    for name in ("requests", "poll_retries", *BYTE_COUNTERS):
+        _print_summary(name, summarize(samples.totals[name]))
+    if not samples.phases:
+        return
+    print("  Mean by phase:")
+    totalBytes = sum(samples.totals[name].mean() for name in BYTE_COUNTERS) or 1.0
+    print(f"    {'phase':<16}{'time (s)':>10}{'requests':>10}" +
+          "".join(f"{name:>18}" for name in BYTE_COUNTERS) + f"{'share':>8}")
+    for phase, counters in samples.phases.items():
+        phaseBytes = sum(counters[name].mean() for name in BYTE_COUNTERS)
+        print(f"    {phase:<16}{counters['wall_time'].mean():>10.4f}{counters['requests'].mean():>10.1f}" +
+              "".join(f"{counters[name].mean():>18.1f}" for name in BYTE_COUNTERS) +
+              f"{phaseBytes / totalBytes:>8.1%}")
+
+
+def compare(samples: Samples, baseline: Samples) -> None:
+    """Print the change of the median, p95 and mean of every metric from a baseline."""
+    print(f"{len(samples)} samples, against {len(baseline)} baseline samples")
+    for name in ("wall_time", "requests", "poll_retries", *BYTE_COUNTERS):
+        new, old = summarize(samples.totals[name]), summarize(baseline.totals[name])
+        if not new["count"] or not old["count"]:
+            continue
+        changes = list()
+        for key in ("p50", "p95", "mean"):
+            change = (new[key] - old[key]) / old[key] if old[key] else 0.0
+            changes.append(f"{key}={_format(old[key])}->{_format(new[key])} ({change:+.1%})")
+        print(f"  {name:<18}" + "  ".join(changes))
+
+
+def main(args: List[str]) -> None:
+    parser = argparse.ArgumentParser(description="Statistics of the metrics of the clients")
+    parser.add_argument("paths", nargs="*", default=["metrics.jsonl"],
+                        help="metrics files (default: metrics.jsonl)")
+    parser.add_argument("--group-by", metavar="LABEL",
+                        help="report separately for every value of a label (e.g. benchmark, client)")
+    parser.add_argument("--compare", nargs="+", metavar="PATH",
+                        help="metrics files of a baseline run to compare to")
+    options = parser.parse_args(args)
+
+    samples = load(options.paths)
+    baselines = load(options.compare).groups(options.group_by) if options.compare else None
+    for group, groupSamples in samples.groups(options.group_by).items():
+        print(f"[{group}]")
+        if baselines is None:
+            report(groupSamples)
+        elif group in baselines:
+            compare(groupSamples, baselines[group])
+        else:
+            print("  no baseline")
+        print()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
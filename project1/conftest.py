@@ -0,0 +1,129 @@
+"""
+Fixtures shared by the tests of the transports: they run a computation with one party per
+participant, over the communications built by a transport factory, and start servers.
+"""
+
+import asyncio
+import socket
+import threading
+from multiprocessing import Process, Queue
+
+import pytest
+
+from async_server import AsyncServer
+from expression import Scalar, Secret
+from protocol import ProtocolSpec
+from smc_party import SMCParty
+
+# Participants of the computation of `suite`
+SUITE_PARTICIPANTS = ["Alice", "Bob", "Charlie"]
+
+
+def pytest_addoption(parser):
+    parser.addoption("--metrics-path", metavar="PATH",
+                     help="file to append the metrics of the clients of the benchmarks to "
+                          "(default: a temporary file)")
+
+
+def _run_parties(parties, expr, transport, mode="sync", session_id=None):
+    """
+    Run a computation, and return the results of the parties by participant.
+
+    Args:
+        parties: Values of the secrets of every participant
+        expr: Expression to compute
+        transport: Builds the communications of a participant from its ID, e.g. `hub.communication`
+        mode: Run the parties with `run` in threads ("sync"), with `run_async` in threads
+            ("async"), or with `run` in forked processes ("processes")
+        session_id: Session of the computation on the server (default: the default session)
+    """
+    prot = ProtocolSpec(expr=expr, participant_ids=list(parties.keys()))
+    results = dict()
+    queue = Queue()
+
+    def client(name, value_dict):
+        cli = SMCParty(name, "", 0, protocol_spec=prot, value_dict=value_dict,
+                       session_id=session_id, comm=transport(name))
+        result = asyncio.run(cli.run_async()) if mode == "async" else cli.run()
+        cli.comm.close()
+        if mode == "processes":
+            queue.put((name, result))
+        else:
+            results[name] = result
+
+    workers = [(Process if mode == "processes" else threading.Thread)(target=client, args=item)
+               for item in parties.items()]
+    for worker in workers:
+        worker.start()
+    if mode == "processes":
+        # A process only exits once its result is read
+        results.update(queue.get() for _ in workers)
+    for worker in workers:
+        worker.join()
+    return results
+
+
+@pytest.fixture
+def run_parties():
+    return _run_parties
+
+
+@pytest.fixture
+def suite():
+    """
+    Check a computation on scalars and vectors, f(a, b, c) = (a * b + c) * a + K0, with the
+    participants `suite.participants` (see `run_parties` for the arguments).
+    """
+    def check(transport, mode="sync", session_id=None):
+        a = Secret()
+        b = Secret()
+        c = Secret()
+        parties = dict(zip(SUITE_PARTICIPANTS, [{a: 3}, {b: 14}, {c: [2, 5]}]))
+        results = _run_parties(parties, (a * b + c) * a + Scalar(4), transport, mode, session_id)
+        assert results == {name: [(3*14+2)*3+4, (3*14+5)*3+4] for name in parties}
+    check.participants = SUITE_PARTICIPANTS
+    return check
+
+
+@pytest.fixture
+def bad_requests():
+    """
+    Requests in error and the status both servers answer them with, as (method, path, body,
+    status), once the session "contract" is created for Alice and Bob.
+    """
+    return [
+        ("POST", "/sessions/contract", b"{}", 400),
+        ("POST", "/sessions/contract", b"not json", 400),
+        ("POST", "/sessions/contract/bulk/public/Alice", b'{"channels": [["Bob"]]}', 400),
+        ("GET", "/sessions/unknown/shares/Alice/op/2", b"", 404),
+        ("GET", "/sessions/contract/shares/Eve/op", b"", 404),
+        ("GET", "/sessions/contract/shares/Eve/op/2", b"", 404),
+        ("GET", "/sessions/contract/shares/Alice/op/many", b"", 400),
+    ]
+
+
+@pytest.fixture
+def async_server():
+    """
+    Start an asyncio server with some participants in the default session, in a background
+    thread, and return its port.
+    """
+    def start(participants):
+        with socket.socket() as sock:
+            sock.bind(("localhost", 0))
+            port = sock.getsockname()[1]
+        loop = asyncio.new_event_loop()
+        server = AsyncServer(participants)
+        started = threading.Event()
+
+        def serve():
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(asyncio.start_server(
+                server.handle_connection, "localhost", port))
+            started.set()
+            loop.run_forever()
+
+        threading.Thread(target=serve, daemon=True).start()
+        started.wait()
+        return port
+    return start
@@ -10,34 +10,57 @@ MODIFY THIS FILE.
 """
 
 import base64
-import random
-from typing import Optional
+import heapq
+import itertools
+import os
+from typing import Dict, List, Optional, Tuple
 
+from secret_sharing import MODULUS
 
-ID_BYTES = 4
+
+ID_BYTES = 16
+
+# IDs are a random 64-bit prefix, drawn once per process, followed by a counter: they are
+# unique within a process, and IDs of different processes only collide if their prefixes do,
+# with a probability of about n^2 / 2^65 for n processes (birthday bound). Forked children
+# draw a new prefix, or they would generate the same IDs as their parent.
+_ID_PREFIX = os.urandom(ID_BYTES // 2)
+_ID_COUNTER = itertools.count()
+
+
+def _reset_ids() -> None:
+    global _ID_PREFIX, _ID_COUNTER
+    _ID_PREFIX = os.urandom(ID_BYTES // 2)
+    _ID_COUNTER = itertools.count()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_ids)
 
 
 def gen_id() -> bytes:
-    id_bytes = bytearray(
-        random.getrandbits(8) for _ in range(ID_BYTES)
-    )
-    return base64.b64encode(id_bytes)
+    return base64.b64encode(_ID_PREFIX + next(_ID_COUNTER).to_bytes(ID_BYTES // 2, "big"))
+
+
+# Expressions are immutable: their attributes are only set by their constructor
+_set = object.__setattr__
 
 
 class Expression:
     """
     Base class for an arithmetic expression.
+
+    Expressions are immutable, and use slots instead of a per-instance dictionary, so that
+    large generated expressions are cheap to build.
     """
 
-    def __init__(
-        self,
-        id: Optional[bytes] = None
-    ):
-        # If ID is not given, then generate one.
-        if id is None:
-            id = gen_id()
-        self.id = id
-        self.containsSecret = True
+    __slots__ = ("containsSecret",)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
 
     def __add__(self, other):
         return Add(self, other)
@@ -48,27 +71,24 @@ class Expression:
     def __mul__(self, other):
         return Mult(self, other)
 
-    def __hash__(self):
-        return hash(self.id)
-
     # Feel free to add as many methods as you like.
 
 
 class Scalar(Expression):
     """Term representing a scalar finite field value."""
 
-    def __init__(
-        self,
-        value: int,
-        id: Optional[bytes] = None
-    ):
-        self.value = value
-        super().__init__(id)
-        self.containsSecret = False
+    __slots__ = ("value",)
+
+    def __init__(self, value: int):
+        _set(self, "value", value)
+        _set(self, "containsSecret", False)
 
     def __repr__(self):
         return f"{self.__class__.__name__}({repr(self.value)})"
 
+    def __reduce__(self):
+        return Scalar, (self.value,)
+
     def __hash__(self):
         return
 
@@ -76,15 +96,36 @@ class Scalar(Expression):
 
 
 class Secret(Expression):
-    """Term representing a secret finite field value (variable)."""
+    """
+    Term representing a secret finite field value (variable).
+
+    Secrets are the only nodes with an ID, shared by the clients to refer to them. It is
+    generated on first use, unless given.
+    """
+
+    __slots__ = ("value", "_id")
 
     def __init__(
         self,
         value: Optional[int] = None,
         id: Optional[bytes] = None
     ):
-        self.value = value
-        super().__init__(id)
+        _set(self, "value", value)
+        _set(self, "_id", id)
+        _set(self, "containsSecret", True)
+
+    @property
+    def id(self) -> bytes:
+        if self._id is None:
+            _set(self, "_id", gen_id())
+        return self._id
+
+    def __reduce__(self):
+        # The ID is generated before pickling, so that every copy of the secret has the same
+        return Secret, (self.value, self.id)
+
+    def __hash__(self):
+        return hash(self.id)
 
     def __repr__(self):
         return (
@@ -95,55 +136,200 @@ class Secret(Expression):
 
 
 # Feel free to add as many classes as you like.
-class Add(Expression):
-    """Add two expressions together. Inherits the base `Expression` class."""
+class BinaryOperation(Expression):
+    """Base class of the operations on two expressions."""
+
+    __slots__ = ("leftExpression", "rightExpression")
 
     def __init__(
         self,
         leftExpression: Expression,
-        rightExpression: Expression,
-        id: Optional[bytes] = None
+        rightExpression: Expression
     ):
-        super().__init__(id)
-        self.leftExpression = leftExpression
-        self.rightExpression = rightExpression
-        self.containsSecret = self.leftExpression.containsSecret or self.rightExpression.containsSecret
+        _set(self, "leftExpression", leftExpression)
+        _set(self, "rightExpression", rightExpression)
+        _set(self, "containsSecret",
+             leftExpression.containsSecret or rightExpression.containsSecret)
+
+    def __reduce__(self):
+        return self.__class__, (self.leftExpression, self.rightExpression)
+
+
+class Add(BinaryOperation):
+    """Add two expressions together. Inherits the base `Expression` class."""
+
+    __slots__ = ()
 
     def __repr__(self):
         return f"({self.leftExpression.__repr__()} + {self.rightExpression.__repr__()})"
 
 
-class Sub(Expression):
+class Sub(BinaryOperation):
     """Subtract two expressions from one another. Inherits the base `Expression` class."""
 
-    def __init__(
-        self,
-        leftExpression: Expression,
-        rightExpression: Expression,
-        id: Optional[bytes] = None
-    ):
-        super().__init__(id)
-        self.leftExpression = leftExpression
-        self.rightExpression = rightExpression
-        self.containsSecret = self.leftExpression.containsSecret or self.rightExpression.containsSecret
+    __slots__ = ()
 
     def __repr__(self):
         return f"({self.leftExpression.__repr__()} - {self.rightExpression.__repr__()})"
 
 
-class Mult(Expression):
+class Mult(BinaryOperation):
     """Multiply two expressions together. Inherits the base `Expression` class."""
 
-    def __init__(
-        self,
-        leftExpression: Expression,
-        rightExpression: Expression,
-        id: Optional[bytes] = None
-    ):
-        super().__init__(id)
-        self.leftExpression = leftExpression
-        self.rightExpression = rightExpression
-        self.containsSecret = self.leftExpression.containsSecret or self.rightExpression.containsSecret
+    __slots__ = ()
 
     def __repr__(self):
         return f"{self.leftExpression.__repr__()} * {self.rightExpression.__repr__()}"
+
+
+def simplify(expr: Expression) -> Expression:
+    """
+    Return an equivalent expression with fewer gates and a lower multiplicative depth.
+
+    Scalar-only subexpressions are folded, the identities `x + 0`, `x - 0`, `x * 1`, `x * 0`
+    and `x - x` are removed, and chains of multiplications are rebuilt as balanced trees, so
+    that a chain of n secret factors needs log2(n) Beaver rounds instead of n - 1.
+    The expression is traversed with an explicit stack, so deep chains are supported.
+    """
+    # *simplified maps the original nodes (by object identity) to their simplified version
+    simplified: Dict[int, Expression] = dict()
+    # *factorsDict maps the roots of multiplication chains to the factors of the chain
+    factorsDict: Dict[int, List[Expression]] = dict()
+    # *keys numbers the simplified nodes so that structurally equal nodes get the same number
+    keys: Dict[int, int] = dict()
+    keyTable: Dict[Tuple, int] = dict()
+    # *depths is the multiplicative depth of the simplified nodes
+    depths: Dict[int, int] = dict()
+    # Keep the registered nodes alive, so that their object identities are not reused
+    registered: List[Expression] = list()
+
+    def register(node: Expression) -> Expression:
+        if id(node) in keys:
+            return node
+        if isinstance(node, Secret):
+            key: Tuple = ("secret", node.id)
+            depth = 0
+        elif isinstance(node, Scalar):
+            key = ("scalar", node.value % MODULUS)
+            depth = 0
+        else:
+            left = keys[id(node.leftExpression)]
+            right = keys[id(node.rightExpression)]
+            if isinstance(node, Sub):
+                key = ("sub", left, right)
+            else:
+                key = (type(node).__name__, min(left, right), max(left, right))
+            depth = max(depths[id(node.leftExpression)],
+                        depths[id(node.rightExpression)])
+            if isinstance(node, Mult) and node.leftExpression.containsSecret \
+                    and node.rightExpression.containsSecret:
+                depth += 1
+        keys[id(node)] = keyTable.setdefault(key, len(keyTable))
+        depths[id(node)] = depth
+        registered.append(node)
+        return node
+
+    def is_scalar(node: Expression, value: int) -> bool:
+        return isinstance(node, Scalar) and node.value % MODULUS == value
+
+    # *parents counts the parents of every node, by object identity
+    parents: Dict[int, int] = dict()
+    visitStack: List[Expression] = [expr]
+    while visitStack:
+        node = visitStack.pop()
+        if isinstance(node, BinaryOperation):
+            for operand in (node.leftExpression, node.rightExpression):
+                if id(operand) not in parents:
+                    parents[id(operand)] = 0
+                    visitStack.append(operand)
+                parents[id(operand)] += 1
+
+    def chain_factors(node: Mult) -> List[Expression]:
+        # A shared product is a single factor, simplified once: flattening it into every chain
+        # using it would expand the expression exponentially (e.g. repeated squarings)
+        factors = list()
+        stack: List[Expression] = [node.rightExpression, node.leftExpression]
+        while stack:
+            current = stack.pop()
+            if isinstance(current, Mult) and parents[id(current)] == 1:
+                stack.append(current.rightExpression)
+                stack.append(current.leftExpression)
+            else:
+                factors.append(current)
+        return factors
+
+    def multiply(factors: List[Expression]) -> Expression:
+        scalar = 1
+        heap: List[Tuple[int, int, Expression]] = list()
+        for factor in factors:
+            if isinstance(factor, Scalar):
+                scalar = scalar * factor.value % MODULUS
+            else:
+                heap.append((depths[id(factor)], len(heap), factor))
+        if scalar == 0 or not heap:
+            return register(Scalar(scalar))
+        # Always multiply the two shallowest factors together (Huffman-like), which
+        # builds a balanced tree for factors of equal depth
+        counter = len(heap)
+        heapq.heapify(heap)
+        while len(heap) > 1:
+            _, _, left = heapq.heappop(heap)
+            _, _, right = heapq.heappop(heap)
+            product = register(Mult(left, right))
+            heapq.heappush(heap, (depths[id(product)], counter, product))
+            counter += 1
+        product = heap[0][2]
+        if scalar != 1:
+            product = register(Mult(product, register(Scalar(scalar))))
+        return product
+
+    stack: List[Tuple[Expression, bool]] = [(expr, False)]
+    while stack:
+        node, operandsSimplified = stack.pop()
+        if id(node) in simplified:
+            continue
+        if isinstance(node, (Secret, Scalar)):
+            simplified[id(node)] = register(node)
+            continue
+        if isinstance(node, Mult):
+            if id(node) not in factorsDict:
+                factorsDict[id(node)] = chain_factors(node)
+            operands = factorsDict[id(node)]
+        else:
+            operands = [node.leftExpression, node.rightExpression]
+        if not operandsSimplified:
+            stack.append((node, True))
+            for operand in reversed(operands):
+                if id(operand) not in simplified:
+                    stack.append((operand, False))
+            continue
+
+        operands = [simplified[id(operand)] for operand in operands]
+        if isinstance(node, Mult):
+            result = multiply(operands)
+        elif isinstance(node, Add):
+            left, right = operands
+            if isinstance(left, Scalar) and isinstance(right, Scalar):
+                result = Scalar((left.value + right.value) % MODULUS)
+            elif is_scalar(left, 0):
+                result = right
+            elif is_scalar(right, 0):
+                result = left
+            else:
+                result = Add(left, right)
+        elif isinstance(node, Sub):
+            left, right = operands
+            if isinstance(left, Scalar) and isinstance(right, Scalar):
+                result = Scalar((left.value - right.value) % MODULUS)
+            elif is_scalar(right, 0):
+                result = left
+            elif keys[id(left)] == keys[id(right)]:
+                result = Scalar(0)
+            else:
+                result = Sub(left, right)
+        else:
+            raise Exception(
+                "Expression not recognized. Are you sure the input is correct?")
+        simplified[id(node)] = register(result)
+
+    return simplified[id(expr)]
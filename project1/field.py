@@ -0,0 +1,207 @@
+"""
+Arithmetic on NumPy arrays of elements of the field (or ring) the secrets are shared in.
+
+The field is chosen with the `SMC_FIELD` environment variable, which must be the same for
+the server and all the clients:
+
+- "small" (default): the prime field of order 7919, on int64 arrays
+- "mersenne61": the prime field of order 2^61 - 1, on uint64 arrays, with Mersenne reduction
+- "ring64": the ring Z_2^64, on uint64 arrays, with the wraparound of the machine arithmetic
+
+Example:
+>>> field = MersenneField()
+>>> field.mul(field.array([2**60]), field.array([4])).tolist()
+[2]
+"""
+
+import abc
+import os
+from typing import Dict, Sequence, Type
+
+import numpy as np
+
+
+class Field(abc.ABC):
+    """
+    Elements of Z_modulus, stored in NumPy arrays of type `dtype`. The operations take and return
+    arrays of reduced elements, and broadcast like NumPy operations.
+    """
+
+    modulus: int
+    dtype: np.dtype
+
+    def array(self, values: Sequence[int]) -> np.ndarray:
+        """Reduce any integers (or an integer array) into an array of elements."""
+        if not isinstance(values, np.ndarray):
+            try:
+                values = np.asarray(values, dtype=np.int64)
+            except OverflowError:
+                values = np.asarray(values, dtype=object)
+        if values.dtype == object:
+            # Python integers too large for NumPy
+            values = np.array([int(value) % self.modulus for value in values.ravel()],
+                              dtype=np.uint64).reshape(values.shape)
+        elif values.dtype.kind not in "iu":
+            values = values.astype(np.int64)
+        return self._convert(values)
+
+    @abc.abstractmethod
+    def _convert(self, values: np.ndarray) -> np.ndarray:
+        pass
+
+    def zeros(self, shape) -> np.ndarray:
+        return np.zeros(shape, dtype=self.dtype)
+
+    @abc.abstractmethod
+    def add(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        pass
+
+    @abc.abstractmethod
+    def sub(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        pass
+
+    @abc.abstractmethod
+    def mul(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        pass
+
+    def sum(self, values: np.ndarray, axis: int = 0) -> np.ndarray:
+        """Sum the elements of an array along an axis."""
+        values = np.moveaxis(np.asarray(values), axis, 0)
+        total = self.zeros(values.shape[1:])
+        for row in values:
+            total = self.add(total, row)
+        return total
+
+    def linear_combination(self, coefficients: Sequence[int], vectors: Sequence[np.ndarray], constant: int = 0) -> np.ndarray:
+        """Compute `constant + sum(coefficients[i] * vectors[i])` for public integer coefficients."""
+        total = self.array(constant)
+        for coefficient, vector in zip(coefficients, vectors):
+            total = self.add(total, self.mul(vector, self.array(coefficient)))
+        return total
+
+
+class PrimeField(Field):
+    """
+    A prime field small enough that the product of two elements fits in an int64.
+    """
+
+    def __init__(self, modulus: int = 7919):
+        if modulus >= 1 << 31:
+            raise ValueError("Use MersenneField for larger primes")
+        self.modulus = modulus
+        self.dtype = np.dtype(np.int64)
+
+    def _convert(self, values: np.ndarray) -> np.ndarray:
+        if values.dtype.kind == "u":
+            values = values % np.uint64(self.modulus)
+        return values.astype(np.int64) % self.modulus
+
+    def add(self, a, b):
+        return (a + b) % self.modulus
+
+    def sub(self, a, b):
+        return (a - b) % self.modulus
+
+    def mul(self, a, b):
+        return (a * b) % self.modulus
+
+    def sum(self, values, axis=0):
+        # Up to 2^32 reduced elements can be summed in an int64 before reducing
+        return np.asarray(values).sum(axis=axis) % self.modulus
+
+    def linear_combination(self, coefficients, vectors, constant=0):
+        total = constant % self.modulus
+        for coefficient, vector in zip(coefficients, vectors):
+            total = total + (coefficient % self.modulus) * vector
+        return np.asarray(total, dtype=np.int64) % self.modulus
+
+
+class MersenneField(Field):
+    """
+    The prime field of order the Mersenne prime 2^61 - 1.
+
+    Since 2^61 = 1 modulo the prime, a number is reduced by adding its bits above the 61st to
+    its 61 lower bits, with shifts and masks instead of divisions. Products are computed on
+    32-bit halves, so that no intermediate value overflows 64 bits.
+    """
+
+    def __init__(self):
+        self.modulus = (1 << 61) - 1
+        self.dtype = np.dtype(np.uint64)
+        self._m = np.uint64(self.modulus)
+
+    def _reduce(self, x: np.ndarray) -> np.ndarray:
+        """Reduce numbers below 2^64."""
+        x = (x & self._m) + (x >> np.uint64(61))
+        return x - self._m * (x >= self._m)
+
+    def _convert(self, values):
+        if values.dtype.kind == "i":
+            return (values.astype(np.int64) % self.modulus).astype(np.uint64)
+        return self._reduce(values.astype(np.uint64))
+
+    def add(self, a, b):
+        return self._reduce(a + b)
+
+    def sub(self, a, b):
+        return self._reduce(a + (self._m - b))
+
+    def mul(self, a, b):
+        mask32 = np.uint64(0xFFFFFFFF)
+        a_hi, a_lo = a >> np.uint64(32), a & mask32
+        b_hi, b_lo = b >> np.uint64(32), b & mask32
+        # a*b = a_hi*b_hi*2^64 + (a_hi*b_lo + a_lo*b_hi)*2^32 + a_lo*b_lo, with 2^64 = 8
+        mid = a_hi * b_lo + a_lo * b_hi
+        # mid*2^32 = (mid >> 29)*2^61 + (mid mod 2^29)*2^32 = (mid >> 29) + (mid mod 2^29)*2^32
+        mid = (mid >> np.uint64(29)) + ((mid & np.uint64((1 << 29) - 1)) << np.uint64(32))
+        low = self._reduce(a_lo * b_lo)
+        return self._reduce(self._reduce((a_hi * b_hi) << np.uint64(3)) + self._reduce(mid + low))
+
+
+class Ring64(Field):
+    """
+    The ring Z_2^64, where the wraparound of uint64 arithmetic is the reduction.
+    """
+
+    def __init__(self):
+        self.modulus = 1 << 64
+        self.dtype = np.dtype(np.uint64)
+
+    def _convert(self, values):
+        # Two's complement: casting int64 to uint64 reduces modulo 2^64
+        return values.astype(np.uint64)
+
+    # NumPy warns about the overflows of operations on scalars (0-d arrays)
+
+    def add(self, a, b):
+        with np.errstate(over="ignore"):
+            return a + b
+
+    def sub(self, a, b):
+        with np.errstate(over="ignore"):
+            return a - b
+
+    def mul(self, a, b):
+        with np.errstate(over="ignore"):
+            return a * b
+
+    def sum(self, values, axis=0):
+        return np.asarray(values).sum(axis=axis, dtype=np.uint64)
+
+
+FIELDS: Dict[str, Type[Field]] = {
+    "small": PrimeField,
+    "mersenne61": MersenneField,
+    "ring64": Ring64,
+}
+
+
+def field_from_name(name: str) -> Field:
+    """Build the field with the given name (a key of `FIELDS`)."""
+    if name not in FIELDS:
+        raise ValueError(
+            f"Unknown field {name!r}, expected one of {', '.join(FIELDS)}")
+    return FIELDS[name]()
+
+
+FIELD = field_from_name(os.environ.get("SMC_FIELD", "small"))
@@ -0,0 +1,195 @@
+"""
+In-process loopback transport, for parties running on a single host.
+
+A `LoopbackHub` plays the role of the trusted server: it holds the messages and the trusted
+parameter generator of a session, and serves requests in a thread of the process that creates
+it. The clients, threads or processes forked after the hub is created, reach it through
+multiprocessing queues with a `LoopbackCommunication`, which has the same API as a
+`Communication`. No HTTP request is made, so the time of a computation is the time of the
+protocol itself.
+
+Example:
+>>> with LoopbackHub(["Alice", "Bob"]) as hub:
+...     party = SMCParty("Alice", "localhost", 0, prot, values, comm=hub.communication("Alice"))
+"""
+
+import multiprocessing
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from metrics import Metrics
+from session import Session
+from wire import decode_triplets, encode_triplets
+
+
+class LoopbackHub:
+    """
+    Server of the loopback transport for one computation.
+
+    Retrievals of messages that are not sent yet are answered as soon as the messages are sent,
+    so the hub never blocks on a client.
+
+    Args:
+        participants: IDs of the participants of the computation
+    """
+
+    def __init__(self, participants: List[str]):
+        self.participants = list(participants)
+        self.session = Session(self.participants, threading.Event)
+        self.requests: multiprocessing.Queue = multiprocessing.Queue()
+        self.replies: Dict[str, multiprocessing.Queue] = {
+            participant: multiprocessing.Queue() for participant in self.participants}
+        # Retrievals waiting for messages, as (client_id, pool, channels)
+        self.pending: List[Tuple[str, str, List[Tuple[str, str]]]] = list()
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+
+    def __enter__(self) -> "LoopbackHub":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop serving requests, once the requests already made are served.
+        """
+        self.requests.put(None)
+        self.thread.join()
+
+    def communication(self, client_id: str, metrics: Optional[Metrics] = None) -> "LoopbackCommunication":
+        """
+        Build the communications of a participant with the hub.
+        """
+        return LoopbackCommunication(client_id, self.participants, self.requests, self.replies[client_id], metrics)
+
+    def _serve(self) -> None:
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            client_id, operation, args = request
+            getattr(self, f"_{operation}")(client_id, *args)
+
+    def _send_private(self, client_id: str, receiver_id: str, label: str, message: bytes) -> None:
+        self._set_value("private", (receiver_id, label), message)
+
+    def _publish(self, client_id: str, label: str, message: bytes) -> None:
+        self._set_value("public", (client_id, label), message)
+
+    def _retrieve(self, client_id: str, pool: str, channels: List[Tuple[str, str]]) -> None:
+        if not self._answer(client_id, pool, channels):
+            self.pending.append((client_id, pool, channels))
+
+    def _triplets(self, client_id: str, op_id: str, count: Optional[int]) -> None:
+        ttp = self.session.ttp
+        if count is None:
+            shares = [[share.value] for share in ttp.retrieve_share(client_id, op_id)]
+        else:
+            shares = [share.values for share in ttp.retrieve_share_vectors(client_id, op_id, count)]
+        self.replies[client_id].put(encode_triplets(*shares))
+
+    def _set_value(self, pool: str, channel: Tuple[str, str], message: bytes) -> None:
+        self.session.store[pool].put(channel, message, self.session.readers(pool))
+        self.pending = [retrieval for retrieval in self.pending if not self._answer(*retrieval)]
+
+    def _answer(self, client_id: str, pool: str, channels: List[Tuple[str, str]]) -> bool:
+        """
+        Answer a retrieval if all its messages are available.
+
+        Returns:
+            bool: True if the retrieval is answered
+        """
+        store = self.session.store[pool]
+        if not all(channel in store for channel in channels):
+            return False
+        self.replies[client_id].put([store.get(channel, client_id) for channel in channels])
+        return True
+
+
+class LoopbackCommunication:
+    """
+    Communications of a client with a `LoopbackHub`, with the API of a `Communication`.
+
+    The requests of a client are served one at a time, in order.
+
+    Attributes:
+        client_id: Identifier of this client
+        metrics: metrics recording every request, with the bytes of the messages as payload
+            and no header bytes (default: new metrics)
+    """
+
+    def __init__(
+            self,
+            client_id: str,
+            participants: List[str],
+            requests: multiprocessing.Queue,
+            replies: multiprocessing.Queue,
+            metrics: Optional[Metrics] = None
+    ):
+        self.client_id = client_id
+        self.participants = list(participants)
+        self.requests = requests
+        self.replies = replies
+        self.metrics = metrics if metrics is not None else Metrics()
+        # Used by `AsyncCommunication`, the requests are serialized anyway
+        self.pool_size = 1
+        self.lock = threading.Lock()
+
+    def _request(self, operation: str, *args, payload: int = 0, reply: bool = False):
+        """
+        Send a request to the hub, and wait for its reply if it has one.
+        """
+        with self.lock:
+            self.requests.put((self.client_id, operation, args))
+            result = self.replies.get() if reply else None
+        received = sum(map(len, result)) if isinstance(result, list) else len(result or b"")
+        self.metrics.record_request(payload_sent=payload, payload_received=received,
+                                    header_sent=0, header_received=0)
+        return result
+
+    def close(self) -> None:
+        pass
+
+    def create_session(self, participants: List[str]) -> None:
+        """
+        Check that the participants are the ones of the hub, whose session always exists.
+        """
+        if sorted(participants) != sorted(self.participants):
+            raise ValueError("The hub serves a computation with other participants")
+
+    def send_private_message(self, receiver_id: str, label: str, message: Union[bytes, str]) -> None:
+        message = _bytes(message)
+        self._request("send_private", receiver_id, label, message, payload=len(message))
+
+    def retrieve_private_message(self, label: str) -> bytes:
+        return self.retrieve_private_messages([label])[0]
+
+    def retrieve_private_messages(self, labels: List[str]) -> List[bytes]:
+        return self._request("retrieve", "private", [(self.client_id, label) for label in labels], reply=True)
+
+    def publish_message(self, label: str, message: Union[bytes, str]) -> None:
+        message = _bytes(message)
+        self._request("publish", label, message, payload=len(message))
+
+    def retrieve_public_message(self, sender_id: str, label: str) -> bytes:
+        return self.retrieve_public_messages([(sender_id, label)])[0]
+
+    def retrieve_public_messages(self, channels: List[Tuple[str, str]]) -> List[bytes]:
+        return self._request("retrieve", "public", list(channels), reply=True)
+
+    def retrieve_beaver_triplet_shares(self, op_id: str) -> Tuple[int, int, int]:
+        shares = decode_triplets(self._request("triplets", op_id, None, reply=True))
+        return tuple(int(share[0]) for share in shares)  # type: ignore
+
+    def retrieve_beaver_triplet_vectors(self, op_id: str, count: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return decode_triplets(self._request("triplets", op_id, count, reply=True))
+
+
+def _bytes(message: Union[bytes, str]) -> bytes:
+    return message.encode("utf-8") if isinstance(message, str) else message
@@ -0,0 +1,169 @@
+"""
+Metrics of the communications of a client, by protocol phase.
+
+Example:
+>>> metrics = Metrics({"client": "Alice"})
+>>> with metrics.phase("inputs"):
+...     metrics.record_request(payload_sent=10, payload_received=0, header_sent=100, header_received=80)
+>>> metrics.to_dict()["phases"]["inputs"]["requests"]
+1
+
+The metrics can be exported as JSON (`to_json`) or in the Prometheus text format (`to_prometheus`).
+"""
+
+import contextlib
+import json
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+# Phase of the requests made outside of any phase
+DEFAULT_PHASE = "other"
+
+# Counters of a phase, with their Prometheus name and help
+COUNTERS = {
+    "requests": ("smc_requests_total", "Number of HTTP requests"),
+    "poll_retries": ("smc_poll_retries_total", "Number of retrievals repeated because a message was not available"),
+    "payload_sent": ("smc_payload_sent_bytes_total", "Bytes of request bodies"),
+    "payload_received": ("smc_payload_received_bytes_total", "Bytes of response bodies"),
+    "header_sent": ("smc_header_sent_bytes_total", "Bytes of request lines and headers"),
+    "header_received": ("smc_header_received_bytes_total", "Bytes of status lines and response headers"),
+}
+
+
+class PhaseMetrics:
+    """
+    Metrics of a protocol phase.
+
+    Attributes:
+        wall_time: Time spent in the phase, in seconds
+        requests, poll_retries, payload_sent, payload_received, header_sent, header_received:
+            Counters, see `COUNTERS`
+    """
+
+    def __init__(self):
+        self.wall_time = 0.0
+        self.requests = 0
+        self.poll_retries = 0
+        self.payload_sent = 0
+        self.payload_received = 0
+        self.header_sent = 0
+        self.header_received = 0
+
+    def to_dict(self) -> Dict[str, float]:
+        return {"wall_time": self.wall_time, **{name: getattr(self, name) for name in COUNTERS}}
+
+
+class Metrics:
+    """
+    Metrics of a client, by protocol phase. Requests can be recorded from several threads.
+
+    Attributes:
+        labels: Labels identifying the client (e.g. its ID), added to the exports
+        phases: Metrics of every phase, in the order the phases started
+        wall_time: Total time of the computation, in seconds
+    """
+
+    def __init__(self, labels: Optional[Dict[str, str]] = None):
+        self.labels = dict(labels or dict())
+        self.phases: Dict[str, PhaseMetrics] = dict()
+        self.wall_time = 0.0
+        self.current = DEFAULT_PHASE
+        self.lock = threading.Lock()
+
+    def _phase(self, name: str) -> PhaseMetrics:
+        if name not in self.phases:
+            self.phases[name] = PhaseMetrics()
+        return self.phases[name]
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[PhaseMetrics]:
+        """
+        Attribute the requests made in the block to a phase, and time it.
+        """
+        with self.lock:
+            phase = self._phase(name)
+        previous, self.current = self.current, name
+        startTime = time.perf_counter()
+        try:
+            yield phase
+        finally:
+            with self.lock:
+                phase.wall_time += time.perf_counter() - startTime
+            self.current = previous
+
+    def record_request(self, payload_sent: int, payload_received: int, header_sent: int, header_received: int) -> None:
+        """
+        Record a request in the current phase.
+        """
+        with self.lock:
+            phase = self._phase(self.current)
+            phase.requests += 1
+            phase.payload_sent += payload_sent
+            phase.payload_received += payload_received
+            phase.header_sent += header_sent
+            phase.header_received += header_received
+
+    def record_poll_retry(self) -> None:
+        """
+        Record that a retrieval is repeated in the current phase.
+        """
+        with self.lock:
+            self._phase(self.current).poll_retries += 1
+
+    def totals(self) -> PhaseMetrics:
+        """
+        The counters summed over all the phases.
+        """
+        totals = PhaseMetrics()
+        with self.lock:
+            for phase in self.phases.values():
+                for name in COUNTERS:
+                    setattr(totals, name, getattr(totals, name) + getattr(phase, name))
+        totals.wall_time = self.wall_time
+        return totals
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            phases = {name: phase.to_dict() for name, phase in self.phases.items()}
+        return {
+            "labels": self.labels,
+            "wall_time": self.wall_time,
+            "phases": phases,
+            "totals": self.totals().to_dict(),
+        }
+
+    def to_json(self) -> str:
+        """
+        Export the metrics as a single line of JSON.
+        """
+        return json.dumps(self.to_dict())
+
+    def to_prometheus(self) -> str:
+        """
+        Export the metrics in the Prometheus text exposition format, labelled by phase.
+        """
+        def labels(**extra) -> str:
+            pairs = {**self.labels, **extra}
+            return ",".join(f'{key}="{_escape(str(value))}"' for key, value in pairs.items())
+
+        with self.lock:
+            phases = {name: phase.to_dict() for name, phase in self.phases.items()}
+        lines = [
+            "# HELP smc_wall_seconds Time of the computation",
+            "# TYPE smc_wall_seconds gauge",
+            f"smc_wall_seconds{{{labels()}}} {self.wall_time}",
+            "# HELP smc_phase_wall_seconds Time spent in a protocol phase",
+            "# TYPE smc_phase_wall_seconds gauge",
+        ]
+        lines += [f"smc_phase_wall_seconds{{{labels(phase=name)}}} {phase['wall_time']}"
+                  for name, phase in phases.items()]
+        for counter, (metric, description) in COUNTERS.items():
+            lines += [f"# HELP {metric} {description}", f"# TYPE {metric} counter"]
+            lines += [f"{metric}{{{labels(phase=name)}}} {phase[counter]}"
+                      for name, phase in phases.items()]
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
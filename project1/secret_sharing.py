@@ -1,22 +1,39 @@
 """
 Secret sharing scheme.
+
+The secrets are shared in the field (or ring) selected by the `SMC_FIELD` environment
+variable, see `field.py`.
 """
 
-from typing import List
-import random
+import os
+from typing import List, Sequence, Tuple, Union
+
+import numpy as np
+
+from field import FIELD
 
-MODULUS = 7919
+MODULUS = FIELD.modulus
+# Number of bytes needed to encode a single field element with a fixed width (a power of two,
+# so that vectors of elements map to a NumPy integer type).
+SHARE_BYTES = 1 << (((MODULUS - 1).bit_length() + 7) // 8 - 1).bit_length()
+# Largest multiple of the modulus up to 2^64: uniform 64-bit words above it are rejected, so
+# that the random field elements are exactly uniform (None if every word is accepted)
+_SAMPLE_LIMIT = (1 << 64) - (1 << 64) % MODULUS if (1 << 64) % MODULUS else None
 
 
 class Share:
     """
-    A secret share in a finite field.
+    A secret share in a finite field. Shares are immutable.
     """
 
+    __slots__ = ("value",)
+
     def __init__(self, value: int):
         # Adapt constructor arguments as you wish
-        self.value = value
-        self.bn = value
+        object.__setattr__(self, "value", value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Share is immutable")
 
     def __repr__(self):
         # Helps with debugging.
@@ -35,15 +52,77 @@ class Share:
         return int_to_bytes(self.value)
 
 
+class ShareVector:
+    """
+    A vector of secret shares in a finite field, to compute on many values at once. Share
+    vectors are immutable.
+    """
+
+    __slots__ = ("values",)
+
+    def __init__(self, values: Sequence[int]):
+        object.__setattr__(self, "values", FIELD.array(values))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ShareVector is immutable")
+
+    def __repr__(self):
+        return f"ShareVector({self.values.tolist()})"
+
+    def __len__(self):
+        return len(self.values)
+
+    def __add__(self, other):
+        return ShareVector(FIELD.add(self.values, other.values))
+
+    def __sub__(self, other):
+        return ShareVector(FIELD.sub(self.values, other.values))
+
+    def __mul__(self, other):
+        return ShareVector(FIELD.mul(self.values, other.values))
+
+
+def random_elements(shape: Union[int, Tuple[int, ...]]) -> np.ndarray:
+    """Draw an array of uniformly random field elements from the OS CSPRNG."""
+    count = int(np.prod(shape))
+    words = np.zeros(0, dtype=np.uint64)
+    while len(words) < count:
+        # Draw a few more words than needed, to rarely need a second draw
+        needed = count - len(words)
+        draw = np.frombuffer(os.urandom(8 * (needed + needed // 64 + 1)), dtype=np.uint64)
+        if _SAMPLE_LIMIT is not None:
+            draw = draw[draw < np.uint64(_SAMPLE_LIMIT)]
+        words = np.concatenate([words, draw])
+    return FIELD.array(words[:count]).reshape(shape)
+
+
+def share_secret_batch(secrets: Sequence[int], num_shares: int) -> np.ndarray:
+    """Generate secret shares of a whole array of secrets at once.
+
+    Returns:
+        np.ndarray: The shares, where `shares[i]` is the share of participant `i` of every secret
+    """
+    values = FIELD.array(secrets)
+    shares = np.empty((num_shares,) + values.shape, dtype=FIELD.dtype)
+    shares[1:] = random_elements((num_shares - 1,) + values.shape)
+    shares[0] = FIELD.sub(values, FIELD.sum(shares[1:]))
+    return shares
+
+
+def generate_triplets(count: int, num_shares: int) -> np.ndarray:
+    """Generate the secret shares of `count` random Beaver triplets (a, b, c = a*b).
+
+    Returns:
+        np.ndarray: The shares, indexed by (a/b/c, participant, triplet)
+    """
+    a, b = random_elements((2, count))
+    shares = share_secret_batch(np.stack([a, b, FIELD.mul(a, b)]), num_shares)
+    return shares.transpose(1, 0, 2)
+
+
 def share_secret(secret: int, num_shares: int) -> List[Share]:
     """Generate secret shares."""
-    shares = list()
-    for _ in range(num_shares-1):
-        shares.append(Share(random.randrange(0, MODULUS)))
-    totalSum = sum(share.value for share in shares) % MODULUS
-    shareAtZero = Share((secret-totalSum) % MODULUS)
-    shares.insert(0, shareAtZero)
-    return shares
+    return [Share(int(value)) for value in share_secret_batch([secret], num_shares)[:, 0]]
 
 
 def reconstruct_secret(shares: List[Share]) -> int:
@@ -51,6 +130,16 @@ def reconstruct_secret(shares: List[Share]) -> int:
     return sum(share.value for share in shares) % MODULUS
 
 
+def share_secret_vector(secret: Sequence[int], num_shares: int) -> List[ShareVector]:
+    """Generate secret shares of every entry of a vector."""
+    return [ShareVector(row) for row in share_secret_batch(secret, num_shares)]
+
+
+def reconstruct_secret_vector(shares: List[ShareVector]) -> List[int]:
+    """Reconstruct a vector of secrets from shares."""
+    return FIELD.sum(np.stack([share.values for share in shares])).tolist()
+
+
 def int_to_bytes(x: int) -> bytes:
     return x.to_bytes((x.bit_length() + 7) // 8, 'big')
 
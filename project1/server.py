@@ -3,40 +3,72 @@ Trusted server that should help SMC client to communicate.
 You should not need to change this file.
 """
 
-import collections
+import socketserver
 import sys
+import threading
+import time
 from os import environ
-from typing import Dict, List, Optional, Tuple
+from typing import List, Optional, Tuple
 
-from flask import Flask, request, Response, jsonify
+from flask import abort, Flask, request, Response
 
-from ttp import TrustedParamGenerator
+from session import DEFAULT_SESSION, MAX_WAIT, Session, Sessions
+from wire import (
+    encode_frame, encode_messages, encode_triplets, read_frame,
+    OP_CREATE_SESSION, OP_HELLO, OP_PUBLISH, OP_RETRIEVE_PRIVATE, OP_RETRIEVE_PUBLIC,
+    OP_SEND_PRIVATE, OP_TRIPLETS, STATUS_ERROR, STATUS_OK,
+)
 
 
 environ["WERKZEUG_RUN_MAIN"] = "true"
 app: Flask = Flask("Trusted Third Party Server")
-store: Dict[str, Dict[Tuple[str, str], bytes]] = collections.defaultdict(dict)
-ttp: TrustedParamGenerator = TrustedParamGenerator()
+# Every session holds the messages of every pool, by channel. Every channel has an event, set
+# once a value is pushed to it, to wake up waiting retrievals. A message is dropped once all its
+# readers retrieved it.
+sessions: Sessions = Sessions(threading.Event)
+# Port of the stream listener of `main`
+STREAM_PORT = 5001
+# Operations of the stream transport that are answered (the others only when they fail)
+STREAM_REPLIES = (OP_CREATE_SESSION, OP_RETRIEVE_PRIVATE, OP_RETRIEVE_PUBLIC, OP_TRIPLETS)
+
+
+@app.route("/sessions/<session_id>", methods=["POST"])
+def create_session(session_id: str):
+    """
+    Create a session for a computation. The body is a JSON object with the list of "participants".
+    Creating an existing session with the same participants does nothing, so that every
+    participant can create it.
+    """
+    participants = request.get_json(force=True)["participants"]
+    if not sessions.create(session_id, participants):
+        return Response(status=409)
+    print(f"[ SESSION  ] {session_id} / {len(participants)} PARTICIPANTS")
+    return Response(status=200)
 
 
 @app.route("/private/<sender_id>/<receiver_id>/<label>", methods=["POST"])
-def send_private_message(sender_id: str, receiver_id: str, label: str):
+@app.route("/sessions/<session_id>/private/<sender_id>/<receiver_id>/<label>", methods=["POST"])
+def send_private_message(sender_id: str, receiver_id: str, label: str, session_id: str = DEFAULT_SESSION):
     """
     The client send a private message to the server.
     """
     print(
         f"[ SEND     ] SENDER {sender_id} / LABEL {label} / RECEIVER {receiver_id}"
     )
-    _set_value("private", (receiver_id, label), request.get_data())
+    _set_value(_session(session_id), "private",
+               (receiver_id, label), request.get_data())
     return Response(status=200)
 
 
 @app.route("/private/<receiver_id>/<label>", methods=["GET"])
-def retrieve_private_message(receiver_id: str, label: str):
+@app.route("/sessions/<session_id>/private/<receiver_id>/<label>", methods=["GET"])
+def retrieve_private_message(receiver_id: str, label: str, session_id: str = DEFAULT_SESSION):
     """
-    The client retrieve a private message from the server.
+    The client retrieve a private message from the server, waiting at most `timeout` seconds
+    (query parameter) for it to be sent.
     """
-    res = _get_value("private", (receiver_id, label))
+    res = _get_value(_session(session_id), "private", (receiver_id, label),
+                     receiver_id, _wait_timeout())
     if res is not None:
         print(f"[ RETRIEVE ] RECEIVER {receiver_id} / LABEL {label}")
         return res, 200
@@ -45,21 +77,26 @@ def retrieve_private_message(receiver_id: str, label: str):
 
 
 @app.route("/public/<sender_id>/<label>", methods=["POST"])
-def publish_message(sender_id: str, label: str):
+@app.route("/sessions/<session_id>/public/<sender_id>/<label>", methods=["POST"])
+def publish_message(sender_id: str, label: str, session_id: str = DEFAULT_SESSION):
     """
     The client publish a public message on the server.
     """
     print(f"[ PUBLISH  ] SENDER {sender_id} / LABEL {label}")
-    _set_value("public", (sender_id, label), request.get_data())
+    _set_value(_session(session_id), "public",
+               (sender_id, label), request.get_data())
     return Response(status=200)
 
 
 @app.route("/public/<receiver_id>/<sender_id>/<label>", methods=["GET"])
-def retrieve_public_message(receiver_id: str, sender_id: str, label: str):
+@app.route("/sessions/<session_id>/public/<receiver_id>/<sender_id>/<label>", methods=["GET"])
+def retrieve_public_message(receiver_id: str, sender_id: str, label: str, session_id: str = DEFAULT_SESSION):
     """
-    The client retrieve a public message from the server.
+    The client retrieve a public message from the server, waiting at most `timeout` seconds
+    (query parameter) for it to be published.
     """
-    res = _get_value("public", (sender_id, label))
+    res = _get_value(_session(session_id), "public", (sender_id, label),
+                     receiver_id, _wait_timeout())
     if res is not None:
         print(
             f"[ RETRIEVE ] RECEIVER {receiver_id}. LABEL {label} / SENDER {sender_id}"
@@ -68,45 +105,247 @@ def retrieve_public_message(receiver_id: str, sender_id: str, label: str):
     return Response(status=404)
 
 
+@app.route("/bulk/private/<receiver_id>", methods=["POST"])
+@app.route("/sessions/<session_id>/bulk/private/<receiver_id>", methods=["POST"])
+def retrieve_private_messages(receiver_id: str, session_id: str = DEFAULT_SESSION):
+    """
+    The client retrieve several private messages at once. The body is a JSON object with the
+    list of "labels" to retrieve and an optional "timeout" to wait for all of them. The response
+    is the list of messages in the binary wire format.
+    """
+    query = request.get_json(force=True)
+    channels = [(receiver_id, label) for label in query["labels"]]
+    print(f"[ RETRIEVE ] RECEIVER {receiver_id} / {len(channels)} LABELS")
+    return _binary(encode_messages(_get_values(_session(session_id), "private", channels, receiver_id, query.get("timeout", 0.0))))
+
+
+@app.route("/bulk/public/<receiver_id>", methods=["POST"])
+@app.route("/sessions/<session_id>/bulk/public/<receiver_id>", methods=["POST"])
+def retrieve_public_messages(receiver_id: str, session_id: str = DEFAULT_SESSION):
+    """
+    The client retrieve several public messages at once. The body is a JSON object with the
+    list of [sender_id, label] "channels" to retrieve and an optional "timeout" to wait for
+    all of them. The response is the list of messages in the binary wire format.
+    """
+    query = request.get_json(force=True)
+    channels = [(sender_id, label) for sender_id, label in query["channels"]]
+    print(f"[ RETRIEVE ] RECEIVER {receiver_id} / {len(channels)} CHANNELS")
+    return _binary(encode_messages(_get_values(_session(session_id), "public", channels, receiver_id, query.get("timeout", 0.0))))
+
+
 @app.route("/shares/<client_id>/<op_id>", methods=["GET"])
-def retrieve_share(client_id: str, op_id: str):
+@app.route("/sessions/<session_id>/shares/<client_id>/<op_id>", methods=["GET"])
+def retrieve_share(client_id: str, op_id: str, session_id: str = DEFAULT_SESSION):
     """
     The client retrieve Beaver triplets generated by the server.
     """
-    shares = ttp.retrieve_share(client_id, op_id)
-    return jsonify([share.bn for share in shares]), 200
+    shares = _participant_session(session_id, client_id).ttp.retrieve_share(client_id, op_id)
+    return _binary(encode_triplets(*([share.value] for share in shares)))
+
+
+@app.route("/shares/<client_id>/<op_id>/<count>", methods=["GET"])
+@app.route("/sessions/<session_id>/shares/<client_id>/<op_id>/<count>", methods=["GET"])
+def retrieve_share_vectors(client_id: str, op_id: str, count: str, session_id: str = DEFAULT_SESSION):
+    """
+    The client retrieve `count` Beaver triplets generated by the server, as vectors.
+    """
+    shares = _participant_session(session_id, client_id).ttp.retrieve_share_vectors(
+        client_id, op_id, int(count))
+    return _binary(encode_triplets(*(share.values for share in shares)))
+
+
+def _wait_timeout() -> float:
+    """
+    Read the time the client is willing to wait for a value.
+    """
+    return min(max(request.args.get("timeout", 0.0, type=float), 0.0), MAX_WAIT)
+
+
+def _session(session_id: str) -> Session:
+    """
+    Get a session, or answer 404 if it does not exist.
+    """
+    session = sessions.get(session_id)
+    if session is None:
+        abort(404)
+    return session
+
+
+def _participant_session(session_id: str, client_id: str) -> Session:
+    """
+    Get a session, or answer 404 if it does not exist or the client is not one of its participants.
+    """
+    session = _session(session_id)
+    if client_id not in session.participants:
+        abort(404)
+    return session
+
+
+@app.errorhandler(KeyError)
+@app.errorhandler(TypeError)
+@app.errorhandler(ValueError)
+def _bad_request(error: Exception):
+    """
+    Answer 400 to requests with malformed parameters or body, as the asyncio server does.
+    """
+    print(f"[ ERROR    ] {request.method} {request.path} / {error!r}")
+    return Response(str(error), status=400, mimetype="text/plain")
 
 
-def _set_value(pool: str, channel: Tuple[str, str], data: bytes) -> None:
+def _set_value(session: Session, pool: str, channel: Tuple[str, str], data: bytes) -> None:
     """
     Push data to a channel in a given pool and send an event.
     """
-    store[pool][channel] = data
+    session.store[pool].put(channel, data, session.readers(pool))
+
+
+def _get_value(session: Session, pool: str, channel: Tuple[str, str], reader: str, timeout: float = 0.0) -> Optional[bytes]:
+    """
+    Subscribe to a channel in a given pool and get it once ready for a reader, waiting at most
+    `timeout` seconds.
+    """
+    store = session.store[pool]
+    value = store.get(channel, reader)
+    if value is None and timeout > 0:
+        store.event(channel).wait(timeout)
+        value = store.get(channel, reader)
+    return value
+
+
+def _binary(data: bytes) -> Response:
+    """
+    Build a response with a binary body.
+    """
+    return Response(data, status=200, mimetype="application/octet-stream")
+
+
+def _get_values(session: Session, pool: str, channels: List[Tuple[str, str]], reader: str, timeout: float) -> List[Optional[bytes]]:
+    """
+    Get the values of several channels in a given pool, waiting at most `timeout` seconds
+    for all of them. Missing values are None.
+    """
+    deadline = time.time() + min(max(float(timeout), 0.0), MAX_WAIT)
+    values = list()
+    for channel in channels:
+        value = _get_value(session, pool, channel,
+                           reader, deadline - time.time())
+        values.append(value)
+    return values
+
+
+class _StreamHandler(socketserver.StreamRequestHandler):
+    """
+    Serve the requests of a client over a stream connection, multiplexed as frames (see `stream`).
+    """
+
+    disable_nagle_algorithm = True
+
+    def handle(self) -> None:
+        self.lock = threading.Lock()
+        self.session_id, self.client_id = DEFAULT_SESSION, ""
+        while True:
+            frame = read_frame(self.rfile)
+            if frame is None:
+                return
+            if frame[1] in (OP_RETRIEVE_PRIVATE, OP_RETRIEVE_PUBLIC):
+                # Retrievals wait for their messages without holding up the next requests
+                threading.Thread(target=self._serve, args=frame, daemon=True).start()
+            else:
+                self._serve(*frame)
+
+    def _serve(self, request_id: int, operation: int, strings: List[str], payload: bytes) -> None:
+        try:
+            reply = self._dispatch(operation, strings, payload)
+        except (LookupError, ValueError) as error:
+            # Every failed request is answered, even if it has no reply otherwise
+            print(f"[ ERROR    ] CLIENT {self.client_id} / {error!r}")
+            self._reply(request_id, STATUS_ERROR, [str(error)])
+            return
+        if operation in STREAM_REPLIES:
+            self._reply(request_id, STATUS_OK, list(), reply)
+
+    def _reply(self, request_id: int, status: int, strings: List[str], payload: bytes = b"") -> None:
+        with self.lock:
+            self.wfile.write(encode_frame(request_id, status, strings, payload))
+
+    def _dispatch(self, operation: int, strings: List[str], payload: bytes) -> bytes:
+        if operation == OP_HELLO:
+            self.session_id, self.client_id = strings[0] or DEFAULT_SESSION, strings[1]
+            return b""
+        if operation == OP_CREATE_SESSION:
+            if not sessions.create(self.session_id, strings):
+                raise ValueError(f"Session {self.session_id} exists with other participants")
+            print(f"[ SESSION  ] {self.session_id} / {len(strings)} PARTICIPANTS")
+            return b""
+        session = sessions.get(self.session_id)
+        if session is None:
+            raise LookupError(f"Unknown session {self.session_id}")
+        if operation == OP_SEND_PRIVATE:
+            receiver_id, label = strings
+            _set_value(session, "private", (receiver_id, label), payload)
+            return b""
+        if operation == OP_PUBLISH:
+            _set_value(session, "public", (self.client_id, strings[0]), payload)
+            return b""
+        if operation == OP_RETRIEVE_PRIVATE:
+            channels = [(self.client_id, label) for label in strings]
+            return encode_messages(_get_values(session, "private", channels, self.client_id, MAX_WAIT))
+        if operation == OP_RETRIEVE_PUBLIC:
+            channels = list(zip(strings[::2], strings[1::2]))
+            return encode_messages(_get_values(session, "public", channels, self.client_id, MAX_WAIT))
+        if operation == OP_TRIPLETS:
+            if len(strings) == 1:
+                shares = session.ttp.retrieve_share(self.client_id, strings[0])
+                return encode_triplets(*([share.value] for share in shares))
+            shares = session.ttp.retrieve_share_vectors(self.client_id, strings[0], int(strings[1]))
+            return encode_triplets(*(share.values for share in shares))
+        raise ValueError(f"Unknown operation {operation}")
+
+
+class _StreamListener(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _UnixStreamHandler(_StreamHandler):
+    # Unix sockets have no Nagle algorithm
+    disable_nagle_algorithm = False
+
+
+class _UnixStreamListener(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
 
 
-def _get_value(pool: str, channel: Tuple[str, str]) -> Optional[bytes]:
+def serve_stream(host: str, port: int, unix_path: Optional[str] = None) -> socketserver.BaseServer:
     """
-    Subscribe to a channel in a given pool and get it once ready.
+    Listen for the stream connections of clients (see `stream`) in a background thread, on a TCP
+    port or a Unix socket. The connections share the sessions of the HTTP routes.
     """
-    if channel not in store[pool]:
-        return None
-    return store[pool][channel]
+    if unix_path is not None:
+        listener: socketserver.BaseServer = _UnixStreamListener(unix_path, _UnixStreamHandler)
+    else:
+        listener = _StreamListener((host, port), _StreamHandler)
+    threading.Thread(target=listener.serve_forever, daemon=True).start()
+    return listener
 
 
-def run(host: str, port: int, participants: List[str]) -> None:
+def run(host: str, port: int, participants: List[str], stream_port: Optional[int] = None) -> None:
     """
-    Register the participants, then run the server.
+    Register the participants of the default session, then run the server, with a stream
+    listener on `stream_port` if given.
     """
-    for participant in participants:
-        ttp.add_participant(participant)
-    app.run(host, port, threaded=False, processes=1)
+    sessions.register_default(participants)
+    if stream_port is not None:
+        serve_stream(host, stream_port)
+    # Retrievals wait for values, so requests must be served concurrently
+    app.run(host, port, threaded=True, processes=1)
 
 
 def main(args: List[str]) -> None:
     """
     Entrypoint of the program.
     """
-    run("localhost", 5000, args)
+    run("localhost", 5000, args, STREAM_PORT)
 
 
 if __name__ == "__main__":
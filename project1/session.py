@@ -0,0 +1,91 @@
+"""
+Sessions of the trusted server.
+
+A session is an independent computation, with its own participants, messages and trusted
+parameter generator, so that many computations can run concurrently on one server. The routes
+without a session ID use the default session, whose participants are given when the server starts.
+"""
+
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from store import BoundedStore, ENTRY_TTL
+from ttp import TrustedParamGenerator
+
+DEFAULT_SESSION = "default"
+# Maximum time in seconds a retrieval can wait for a value, on every server
+MAX_WAIT = 30.0
+# Maximum number of sessions kept at once, the least recently used are evicted beyond it
+MAX_SESSIONS = 1 << 10
+
+
+class Session:
+    """
+    State of a computation on the server.
+
+    Attributes:
+        participants: IDs of the participants
+        store: Messages of every pool ("private" and "public"), by channel
+        ttp: Trusted parameter generator of the participants
+    """
+
+    def __init__(self, participants: List[str], event_factory: Callable[[], Any]):
+        self.participants = list(participants)
+        self.store: Dict[str, BoundedStore] = {
+            "private": BoundedStore(event_factory=event_factory),
+            "public": BoundedStore(event_factory=event_factory),
+        }
+        # The triplets are only generated when requested, sized to the requests
+        self.ttp = TrustedParamGenerator()
+        for participant in participants:
+            self.ttp.add_participant(participant)
+
+    def readers(self, pool: str) -> int:
+        """
+        Number of clients that retrieve each message of a given pool (0 if unknown).
+        """
+        # Public messages are retrieved by every participant, including their sender
+        return 1 if pool == "private" else len(self.participants)
+
+
+class Sessions:
+    """
+    The sessions of a server. Sessions that are not used for `ttl` seconds are evicted.
+
+    Args:
+        event_factory: Constructor of the events of the channels of the sessions
+    """
+
+    def __init__(self, event_factory: Callable[[], Any], max_sessions: int = MAX_SESSIONS, ttl: float = ENTRY_TTL):
+        self.event_factory = event_factory
+        self.default = Session(list(), event_factory)
+        self.sessions = BoundedStore(max_sessions, ttl)
+        self.lock = threading.Lock()
+
+    def register_default(self, participants: List[str]) -> None:
+        """
+        Set the participants of the default session.
+        """
+        self.default = Session(participants, self.event_factory)
+
+    def create(self, session_id: str, participants: List[str]) -> bool:
+        """
+        Create a session, unless it exists. Every participant may create the session.
+
+        Returns:
+            bool: False if the session exists with other participants
+        """
+        with self.lock:
+            session = self.get(session_id)
+            if session is None:
+                self.sessions.put(session_id, Session(participants, self.event_factory))
+                return True
+            return sorted(session.participants) == sorted(participants)
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """
+        Get a session, or None if it does not exist.
+        """
+        if session_id == DEFAULT_SESSION:
+            return self.default
+        return self.sessions.get(session_id, "")
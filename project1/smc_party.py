@@ -5,24 +5,29 @@ MODIFY THIS FILE.
 """
 # You might want to import more classes if needed.
 
-import base64
-from typing import Dict
+import asyncio
+from typing import Dict, List, Optional, Tuple, Union
 
-from communication import Communication
-from expression import (
-    Add, Expression, Mult, Scalar,
-    Secret, Sub
-)
+import numpy as np
+
+from circuit import compile_expression, linearize, LinearCircuit, LinearForm
+from communication import AsyncCommunication, Communication, Transport
+from expression import Secret, simplify
+from field import FIELD
+from metrics import Metrics
 from protocol import ProtocolSpec
 from secret_sharing import(
-    int_from_bytes, int_to_bytes, reconstruct_secret,
-    share_secret,
-    Share,
+    reconstruct_secret_vector, share_secret_batch,
+    ShareVector,
 )
+from wire import decode_vector, encode_vector
 import time
 
 # Feel free to add as many imports as you want.
 
+# Operation ID of the triplets of a whole computation, downloaded at once before the multiplications
+PREPROCESSING_OP = "preprocessing"
+
 
 class SMCParty:
     """
@@ -34,7 +39,17 @@ class SMCParty:
         server_host: hostname of the server
         server_port: port of the server
         protocol_spec (ProtocolSpec): Protocol specification
-        value_dict (dict): Dictionary assigning values to secrets belonging to this client.
+        value_dict (dict): Dictionary assigning values to secrets belonging to this client. A value
+            can be a list of ints, to compute the expression on every entry at once (entries of
+            vectors of the same length are matched up, and integers apply to every entry).
+        session_id (str): Session of the computation on the server. If given, the session is
+            created for the participants of the protocol, so that several computations can
+            run on the same server (default: the default session of the server).
+        metrics_path (str): File to append the metrics of the computation to, as a line of JSON
+            (default: the metrics are only kept in `metrics`)
+        comm (Transport): Communications to use instead of HTTP requests to the server at
+            `server_host`, e.g. a `stream.StreamCommunication`, or a `loopback.LoopbackCommunication`
+            to run all the parties on one host without a server
     """
 
     def __init__(
@@ -43,312 +58,402 @@ class SMCParty:
         server_host: str,
         server_port: int,
         protocol_spec: ProtocolSpec,
-        value_dict: Dict[Secret, int]
+        value_dict: Dict[Secret, Union[int, List[int]]],
+        session_id: Optional[str] = None,
+        metrics_path: Optional[str] = None,
+        comm: Optional[Transport] = None
     ):
-        self.comm = Communication(server_host, server_port, client_id)
+        labels = {"client": client_id}
+        if session_id is not None:
+            labels["session"] = session_id
+        if comm is None:
+            # *metrics records the time and the bytes exchanged in every phase of the protocol
+            self.metrics = Metrics(labels)
+            self.comm: Transport = Communication(
+                server_host, server_port, client_id, session_id=session_id, metrics=self.metrics)
+        else:
+            self.metrics = comm.metrics
+            self.metrics.labels.update(labels)
+            self.comm = comm
+        self.session_id = session_id
+        self.metrics_path = metrics_path
 
         self.client_id = client_id
         self.protocol_spec = protocol_spec
         self.value_dict = value_dict
         # *secretIdDict is the dictionary to map IDs of secrets (base64-encoded) to client IDs (str).
         self.secretIdDict: Dict[str, str] = dict()
-        # *shareDict is the dictionary to store the secret shares retrieved from other clients
-        self.shareDict: Dict[str, Share] = dict()
-        # *tempClientId is the temporary identifier for the intermediate multiplications
-        self.tempClientId = "0"
-        # *tempBytes is the temporary bytes for the intermediate multiplications
-        self.tempBytes = bytes(4)
-        # *receivedBytes is the number of bytes received from the server
-        self.receivedBytes = 0
-        # *sentBytes is the number of bytes sent to the server
-        self.sentBytes = 0
-
-    def run(self) -> int:
+        # *shareDict is the dictionary to map IDs of secrets to the shares retrieved from other clients
+        self.shareDict: Dict[str, ShareVector] = dict()
+
+    def run(self) -> Union[int, List[int]]:
         """
         The method the client use to do the SMC.
         """
-        # If the expression involves only scalars, just compute and return the result
-        startTime = time.time()
-        if not self.protocol_spec.expr.containsSecret:
-            result = self.processScalars(self.protocol_spec.expr)
-            endTime = time.time()
-            timeTaken = "{: .2f}".format(endTime-startTime)
-            print("******************************************")
-            print("Client ID:", self.client_id)
-            print("Time taken:", timeTaken)
-            print("Bytes sent:", self.sentBytes)
-            print("Bytes received:", self.receivedBytes)
-            print("******************************************")
-            with open(f"{self.client_id}.txt", "a") as f:
-                f.write(f"{timeTaken} {self.receivedBytes} {self.sentBytes}\n")
-            return result.value
-
-        secret, secretVal = list(self.value_dict.items())[0]
-        # Publish the IDs of the secrets so that clients know which secret belongs to who
-        self.comm.publish_message("IDs of secrets", secret.id)
-        self.sentBytes += len(secret.id)
-        # Make sure that everyone can publish before reading
-        # time.sleep(1)
-        for client_id in self.protocol_spec.participant_ids:
-            secretValC = self.comm.retrieve_public_message(
-                client_id, "IDs of secrets")
-            self.receivedBytes += len(secretValC)
-            self.secretIdDict[secretValC.decode("utf-8")] = client_id
-        numClients = len(self.protocol_spec.participant_ids)
-        secretShares = share_secret(secretVal, numClients)
-        # Send the shares privately
-        for i, client_id in enumerate(self.protocol_spec.participant_ids):
-            self.comm.send_private_message(
-                client_id, self.client_id, bytes(secretShares[i]))
-            self.sentBytes += len(bytes(secretShares[i]))
-        # Give some time
-        # time.sleep(1)
+        startTime = time.perf_counter()
+        circuit = linearize(compile_expression(
+            simplify(self.protocol_spec.expr)))
+
+        with self.metrics.phase("inputs"):
+            if self.session_id is not None:
+                self.comm.create_session(self.protocol_spec.participant_ids)
+            self.share_inputs()
+        # If the expression does not depend on any secret, just return the result
+        if not circuit.output.wires:
+            self.report(startTime)
+            return self.constant_output(circuit)
+        with self.metrics.phase("preprocessing"):
+            triplets = self.preprocess(circuit)
+        wires = self.input_wires(circuit)
+        # Evaluate the circuit level by level, with one batch round of Beaver multiplications per level
+        for level, mults in enumerate(circuit.levels):
+            if mults:
+                with self.metrics.phase(f"round{level}"):
+                    self.multiplication_round(level, mults, triplets[level], wires)
+        with self.metrics.phase("output"):
+            # Broadcast the result
+            self.comm.publish_message("Final", self.output_message(circuit, wires))
+            # Read the responses and reconstruct the result
+            result = self.reconstruct_output(self.retrieve_from_all("Final"))
+        self.report(startTime)
+        return result
+
+    async def run_async(self, comm: Optional[AsyncCommunication] = None) -> Union[int, List[int]]:
+        """
+        Same as `run`, but all the requests of a step (e.g. to every client, or for every
+        multiplication of a round) are issued concurrently.
+
+        Args:
+            comm (AsyncCommunication): Asynchronous communications to use (default: wrapping `self.comm`)
+        """
+        acomm = comm if comm is not None else AsyncCommunication(self.comm)
+        try:
+            return await self._run_async(acomm)
+        finally:
+            if comm is None:
+                acomm.close()
+
+    async def _run_async(self, acomm: AsyncCommunication) -> Union[int, List[int]]:
+        startTime = time.perf_counter()
+        circuit = linearize(compile_expression(
+            simplify(self.protocol_spec.expr)))
+
+        with self.metrics.phase("inputs"):
+            if self.session_id is not None:
+                await acomm.create_session(self.protocol_spec.participant_ids)
+            # Publish the IDs of the secrets and read the IDs of the other clients
+            message, values = self.secret_ids_message()
+            await acomm.publish_message("IDs of secrets", message)
+            layouts = self.read_secret_ids(await acomm.retrieve_public_messages(
+                self.all_channels("IDs of secrets")))
+            # Send the shares to all the clients concurrently, then obtain ours
+            messages = self.input_share_messages(values)
+            await asyncio.gather(*(
+                acomm.send_private_message(client_id, self.client_id, message)
+                for client_id, message in zip(self.protocol_spec.participant_ids, messages)
+            ))
+            self.read_input_shares(layouts, await acomm.retrieve_private_messages(
+                self.protocol_spec.participant_ids))
+        # If the expression does not depend on any secret, just return the result
+        if not circuit.output.wires:
+            self.report(startTime)
+            return self.constant_output(circuit)
+
+        with self.metrics.phase("preprocessing"):
+            # Download the triplets of all the multiplications at once
+            widths, total = self.triplet_demand(circuit)
+            triplets = self.split_triplets(widths, await acomm.retrieve_beaver_triplet_vectors(
+                PREPROCESSING_OP, total)) if total else list()
+
+        wires = self.input_wires(circuit)
+        for level, mults in enumerate(circuit.levels):
+            if not mults:
+                continue
+            label = f"round{level}"
+            with self.metrics.phase(label):
+                operands, message = self.start_round(mults, triplets[level], wires)
+                await acomm.publish_message(label, message)
+                self.finish_multiplications(operands, triplets[level], await acomm.retrieve_public_messages(
+                    self.all_channels(label)), wires)
+
+        with self.metrics.phase("output"):
+            await acomm.publish_message("Final", self.output_message(circuit, wires))
+            result = self.reconstruct_output(await acomm.retrieve_public_messages(
+                self.all_channels("Final")))
+        self.report(startTime)
+        return result
+
+    def report(self, startTime: float) -> None:
+        """Record the total time, and append the metrics as a line of JSON to `metrics_path` if given."""
+        self.metrics.wall_time = time.perf_counter() - startTime
+        if self.metrics_path is not None:
+            with open(self.metrics_path, "a") as f:
+                f.write(self.metrics.to_json() + "\n")
+
+    def all_channels(self, label: str) -> List[Tuple[str, str]]:
+        """The channels of the messages published with a label by every client."""
+        return [(client_id, label) for client_id in self.protocol_spec.participant_ids]
+
+    def retrieve_from_all(self, label: str) -> List[bytes]:
+        """Retrieve the messages published with a label by every client, in one request."""
+        return self.comm.retrieve_public_messages(self.all_channels(label))
+
+    def share_inputs(self) -> None:
+        """Share all the secrets of this client and retrieve the shares of the other clients' secrets.
+
+        The IDs of all the secrets of a client are published in one message, and the shares
+        of all its secrets for another client are sent in one private message.
+        """
+        message, values = self.secret_ids_message()
+        self.comm.publish_message("IDs of secrets", message)
+        layouts = self.read_secret_ids(self.retrieve_from_all("IDs of secrets"))
+        # Send the shares of all the secrets privately, in one message per client
+        messages = self.input_share_messages(values)
+        for client_id, message in zip(self.protocol_spec.participant_ids, messages):
+            self.comm.send_private_message(client_id, self.client_id, message)
         # Obtain the privately sent shares
-        for client_id in self.protocol_spec.participant_ids:
-            shareBytes = self.comm.retrieve_private_message(client_id)
-            self.receivedBytes += len(shareBytes)
-            self.shareDict[client_id] = Share(int_from_bytes(shareBytes))
-        # time.sleep(1)
-        share = self.process_expression(self.protocol_spec.expr)
-        # Broadcast the result
-        self.comm.publish_message("Final", bytes(share))
-        self.sentBytes += len(bytes(share))
-        # Wait a little
-        # time.sleep(1)
-        # Read the responses
+        self.read_input_shares(layouts, self.comm.retrieve_private_messages(
+            self.protocol_spec.participant_ids))
+
+    def secret_ids_message(self) -> Tuple[bytes, List[np.ndarray]]:
+        """Build the message with the IDs (and lengths) of the secrets of this client.
+
+        Returns:
+            Tuple[bytes, List[np.ndarray]]: The message, and the values of the secrets as vectors
+        """
+        secrets = list(self.value_dict.items())
+        values = [np.atleast_1d(secretVal) for _, secretVal in secrets]
+        message = b",".join(secret.id + b":" + str(len(value)).encode("utf-8")
+                            for (secret, _), value in zip(secrets, values))
+        return message, values
+
+    def read_secret_ids(self, allSecretIds: List[bytes]) -> Dict[str, List[Tuple[str, int]]]:
+        """Register which secret belongs to who.
+
+        Args:
+            allSecretIds (List[bytes]): The secret IDs messages of every client
+
+        Returns:
+            Dict[str, List[Tuple[str, int]]]: The IDs and lengths of the secrets of every client
+        """
+        layouts: Dict[str, List[Tuple[str, int]]] = dict()
+        for client_id, secretIds in zip(self.protocol_spec.participant_ids, allSecretIds):
+            layouts[client_id] = list()
+            for entry in secretIds.decode("utf-8").split(","):
+                if not entry:
+                    continue
+                secretId, width = entry.split(":")
+                self.secretIdDict[secretId] = client_id
+                layouts[client_id].append((secretId, int(width)))
+        return layouts
+
+    def input_share_messages(self, values: List[np.ndarray]) -> List[bytes]:
+        """Share the secrets of this client, and pack the shares of every client in one message."""
+        # All the entries of all the secrets are shared at once
+        shares = share_secret_batch(np.concatenate(
+            [FIELD.zeros(0)] + [FIELD.array(value) for value in values]), len(self.protocol_spec.participant_ids))
+        return [encode_vector(clientShares) for clientShares in shares]
+
+    def read_input_shares(self, layouts: Dict[str, List[Tuple[str, int]]], allShareBytes: List[bytes]) -> None:
+        """Store the shares of the secrets sent by every client."""
+        for client_id, shareBytes in zip(self.protocol_spec.participant_ids, allShareBytes):
+            shares = decode_vector(shareBytes)
+            offset = 0
+            for secretId, width in layouts[client_id]:
+                self.shareDict[secretId] = ShareVector(
+                    shares[offset:offset+width])
+                offset += width
+
+    def preprocess(self, circuit: LinearCircuit) -> List[List[Tuple[np.ndarray, np.ndarray, np.ndarray]]]:
+        """Download the triplets of all the multiplications of the circuit in one request.
+
+        Returns:
+            List[List[Tuple[np.ndarray, np.ndarray, np.ndarray]]]: This client's shares of the
+                triplets (a, b, c) of every multiplication, level by level
+        """
+        widths, total = self.triplet_demand(circuit)
+        if not total:
+            return list()
+        return self.split_triplets(widths, self.comm.retrieve_beaver_triplet_vectors(PREPROCESSING_OP, total))
+
+    def triplet_demand(self, circuit: LinearCircuit) -> Tuple[List[List[int]], int]:
+        """The number of triplets needed by every multiplication (see `triplet_widths`), and in total."""
+        widths = self.triplet_widths(circuit)
+        return widths, sum(sum(levelWidths) for levelWidths in widths)
+
+    def triplet_widths(self, circuit: LinearCircuit) -> List[List[int]]:
+        """The number of triplets needed by every multiplication, level by level.
+
+        A multiplication of vectors needs one triplet per entry. The widths of the secrets
+        must be known, i.e. the inputs must have been shared.
+        """
+        wireWidths = [len(self.shareDict[secretId.decode("utf-8")])
+                      for secretId in circuit.secrets]
+
+        def form_width(form: LinearForm) -> int:
+            return max((wireWidths[wire] for wire in form.wires), default=1)
+
+        widths = list()
+        for mults in circuit.levels:
+            levelWidths = [max(form_width(leftForm), form_width(rightForm))
+                           for leftForm, rightForm in mults]
+            # The results of the multiplications are the next wires
+            wireWidths.extend(levelWidths)
+            widths.append(levelWidths)
+        return widths
+
+    def split_triplets(
+        self,
+        widths: List[List[int]],
+        triplets: Tuple[np.ndarray, np.ndarray, np.ndarray]
+    ) -> List[List[Tuple[np.ndarray, np.ndarray, np.ndarray]]]:
+        """Split the downloaded triplets between the multiplications, in the order of `widths`."""
+        share_a, share_b, share_c = triplets
+        levels = list()
+        offset = 0
+        for levelWidths in widths:
+            levels.append(list())
+            for width in levelWidths:
+                levels[-1].append((share_a[offset:offset+width], share_b[offset:offset+width],
+                                   share_c[offset:offset+width]))
+                offset += width
+        return levels
+
+    def input_wires(self, circuit: LinearCircuit) -> List[np.ndarray]:
+        """This client's shares of the secrets of the circuit, which are the first wires."""
+        return [self.shareDict[secretId.decode("utf-8")].values
+                for secretId in circuit.secrets]
+
+    def output_message(self, circuit: LinearCircuit, wires: List[np.ndarray]) -> bytes:
+        """This client's share of the output, packed."""
+        return encode_vector(np.atleast_1d(self.evaluate_form(circuit.output, wires)))
+
+    def constant_output(self, circuit: LinearCircuit) -> Union[int, List[int]]:
+        """The result of a circuit that does not depend on any secret.
+
+        The constant applies to every entry, so it is repeated if the inputs are vectors. The
+        widths of the inputs must be known, i.e. the inputs must have been shared.
+        """
+        width = max((len(share) for share in self.shareDict.values()), default=1)
+        if width == 1:
+            return circuit.output.constant
+        return [circuit.output.constant] * width
+
+    def reconstruct_output(self, allShares: List[bytes]) -> Union[int, List[int]]:
+        """Reconstruct the result, a single integer unless secrets are vectors."""
         responseShares = list()
-        for client_id in self.protocol_spec.participant_ids:
-            shareFinal = self.comm.retrieve_public_message(client_id, "Final")
-            self.receivedBytes += len(shareFinal)
-            shareFinal = int_from_bytes(shareFinal)
-            shareFinal = Share(shareFinal)
-            responseShares.append(shareFinal)
-        # Reconstruct the result
-        result = reconstruct_secret(responseShares)
-        # print(f"\n\n\n{self.client_id}: result is: {result}\n\n\n")
-        endTime = time.time()
-        timeTaken = "{: .2f}".format(endTime-startTime)
-        print("******************************************")
-        print("Client ID:", self.client_id)
-        print("Time taken: {:.2f}".format(endTime-startTime))
-        print("Bytes sent:", self.sentBytes)
-        print("Bytes received:", self.receivedBytes)
-        print("******************************************")
-        with open(f"{self.client_id}.txt", "a") as f:
-            f.write(f"{timeTaken} {self.receivedBytes} {self.sentBytes}\n")
+        for shareFinal in allShares:
+            responseShares.append(ShareVector(decode_vector(shareFinal)))
+        result = reconstruct_secret_vector(responseShares)
+        if len(result) == 1:
+            return result[0]
         return result
 
-    def processScalars(self, expr: Expression) -> Share:
-        """Just process the scalars and return
+    def evaluate_form(self, form: LinearForm, wires: List[np.ndarray]) -> np.ndarray:
+        """Compute this client's share of a linear form with a single dot product.
 
         Args:
-            expr (Expression): Expression involving scalars
+            form (LinearForm): Linear form to be computed
+            wires (List[np.ndarray]): This client's shares of the wires
 
         Returns:
-            Share: The final result
+            np.ndarray: This client's share of the value of the form
+        """
+        # Public values are added only once, by the first client
+        constant = form.constant if self.client_id == self.protocol_spec.participant_ids[0] else 0
+        return FIELD.linear_combination(
+            form.coefficients, [wires[wire] for wire in form.wires], constant)
+
+    def multiplication_round(
+        self,
+        level: int,
+        mults: List[Tuple[LinearForm, LinearForm]],
+        triplets: List[Tuple[np.ndarray, np.ndarray, np.ndarray]],
+        wires: List[np.ndarray]
+    ) -> None:
+        """Run the Beaver multiplications of one level in a single batch round.
+
+        The masked operands x-a and y-b of all the multiplications are published in one
+        message, so the round costs one publish and one retrieval per client. Each
+        multiplication is done entry-wise on vectors, with one triplet per entry.
+
+        Args:
+            level (int): Multiplicative depth of the multiplications
+            mults (List[Tuple[LinearForm, LinearForm]]): Operands of independent multiplications
+            triplets (List[Tuple[np.ndarray, np.ndarray, np.ndarray]]): This client's shares of the
+                preprocessed triplets of the multiplications
+            wires (List[np.ndarray]): This client's shares of the wires, extended in place with the
+                shares of the results
+        """
+        operands, message = self.start_round(mults, triplets, wires)
+        # Broadcast the computed shares
+        label = f"round{level}"
+        self.comm.publish_message(label, message)
+        # Read the shares and compute the results
+        self.finish_multiplications(
+            operands, triplets, self.retrieve_from_all(label), wires)
+
+    def start_round(
+        self,
+        mults: List[Tuple[LinearForm, LinearForm]],
+        triplets: List[Tuple[np.ndarray, np.ndarray, np.ndarray]],
+        wires: List[np.ndarray]
+    ) -> Tuple[List[Tuple[np.ndarray, np.ndarray]], bytes]:
+        """This client's shares of the operands of the multiplications of a round, and the message
+        of their masked operands to publish (see `finish_multiplications` for the end of the round).
+        """
+        operands = self.mult_operands(mults, wires)
+        return operands, self.masked_operands_message(operands, triplets)
+
+    def mult_operands(self, mults: List[Tuple[LinearForm, LinearForm]], wires: List[np.ndarray]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """This client's shares of the operands of multiplications, as vectors of the same length."""
+        operands = list()
+        for leftForm, rightForm in mults:
+            x = self.evaluate_form(leftForm, wires)
+            y = self.evaluate_form(rightForm, wires)
+            # Integers are multiplied with every entry of vectors
+            width = np.broadcast(x, y).size
+            operands.append((np.broadcast_to(x, (width,)),
+                             np.broadcast_to(y, (width,))))
+        return operands
+
+    def masked_operands_message(self, operands: List[Tuple[np.ndarray, np.ndarray]], triplets: List[Tuple]) -> bytes:
+        """Pack the shares of x-a for every multiplication, followed by the shares of y-b."""
+        x_a_list = list()
+        y_b_list = list()
+        for (x, y), (share_a, share_b, _) in zip(operands, triplets):
+            x_a_list.append(FIELD.sub(x, share_a))
+            y_b_list.append(FIELD.sub(y, share_b))
+        return encode_vector(np.concatenate(x_a_list + y_b_list))
+
+    def finish_multiplications(
+        self,
+        operands: List[Tuple[np.ndarray, np.ndarray]],
+        triplets: List[Tuple],
+        responses: List[bytes],
+        wires: List[np.ndarray]
+    ) -> None:
+        """Reconstruct the x-a and y-b of every multiplication, and compute the shares of the results.
+
+        Args:
+            operands (List[Tuple[np.ndarray, np.ndarray]]): This client's shares of the operands
+            triplets (List[Tuple]): This client's shares of the triplet of every multiplication
+            responses (List[bytes]): The masked operands messages of every client
+            wires (List[np.ndarray]): This client's shares of the wires, extended in place with the
+                shares of the results
         """
-        if isinstance(expr, Scalar):
-            return Share(expr.value)
-        if isinstance(expr, Add):
-            return self.processScalars(expr.leftExpression) + self.processScalars(expr.rightExpression)
-        if isinstance(expr, Sub):
-            return self.processScalars(expr.leftExpression) - self.processScalars(expr.rightExpression)
-        if isinstance(expr, Mult):
-            return self.processScalars(expr.leftExpression) * self.processScalars(expr.rightExpression)
-        return Share(0)
-
-    # Suggestion: To process expressions, make use of the *visitor pattern* like so:
-
-    def process_expression(self, expr: Expression) -> Share:
-        if isinstance(expr, Add):
-            # Process the `Add` expression based on its left and right expressions
-            if isinstance(expr.leftExpression, Scalar) and isinstance(expr.rightExpression, Scalar):
-             # If the current client is the first client
-                if self.client_id == self.protocol_spec.participant_ids[0]:
-                    return self.process_expression(expr.leftExpression) + self.process_expression(expr.rightExpression)
-                # Otherwise, don't add the scalar values
-                return Share(0) + Share(0)
-            if isinstance(expr.leftExpression, Scalar):
-                if self.client_id == self.protocol_spec.participant_ids[0]:
-                    return self.process_expression(expr.leftExpression) + self.process_expression(expr.rightExpression)
-                return Share(0) + self.process_expression(expr.rightExpression)
-            if isinstance(expr.rightExpression, Scalar):
-                if self.client_id == self.protocol_spec.participant_ids[0]:
-                    return self.process_expression(expr.leftExpression) + self.process_expression(expr.rightExpression)
-                return self.process_expression(expr.leftExpression) + Share(0)
-            return self.process_expression(expr.leftExpression) + self.process_expression(expr.rightExpression)
-
-        if isinstance(expr, Sub):
-            # Process the `Sub` expression based on its left and right expressions
-            if isinstance(expr.leftExpression, Scalar) and isinstance(expr.rightExpression, Scalar):
-                # If the current client is the first client
-                if self.client_id == self.protocol_spec.participant_ids[0]:
-                    return self.process_expression(expr.leftExpression) - self.process_expression(expr.rightExpression)
-                # Otherwise, don't subtract the scalar values
-                return Share(0) - Share(0)
-            if isinstance(expr.leftExpression, Scalar):
-                if self.client_id == self.protocol_spec.participant_ids[0]:
-                    return self.process_expression(expr.leftExpression) - self.process_expression(expr.rightExpression)
-                return Share(0) - self.process_expression(expr.rightExpression)
-            if isinstance(expr.rightExpression, Scalar):
-                if self.client_id == self.protocol_spec.participant_ids[0]:
-                    return self.process_expression(expr.leftExpression) - self.process_expression(expr.rightExpression)
-                return self.process_expression(expr.leftExpression) - Share(0)
-            return self.process_expression(expr.leftExpression) - self.process_expression(expr.rightExpression)
-
-        if isinstance(expr, Mult):
-            # ?Are the case structures too complicated? Can they be further simplified?
-            # If the expression `Mult` involves secrets, we need to use "Beaver triplets"
-            if isinstance(expr.leftExpression, Secret) and isinstance(expr.rightExpression, Secret):
-                opId = ""
-                # x is the client_id
-                x = self.secretIdDict[expr.leftExpression.id.decode("utf-8")]
-                opId += x
-                # x is the share of the client_id
-                x = self.shareDict[x]
-                # y is the client_id
-                y = self.secretIdDict[expr.rightExpression.id.decode("utf-8")]
-                opId += y
-                # print("\n\n\n", "OpId:", opId, "\n\n\n")
-                # y is the share of client_id
-                y = self.shareDict[y]
-                share_a, share_b, share_c = self.comm.retrieve_beaver_triplet_shares(
-                    opId)
-                # Assuming that an integer is 4 bytes
-                self.receivedBytes += 12
-                share_a, share_b, share_c = Share(
-                    share_a), Share(share_b), Share(share_c)
-                x_a_broadcast = x-share_a
-                y_b_broadcast = y-share_b
-                # Broadcast the computed shares
-                opId_x_a = opId+"_x_a"
-                opId_y_b = opId+"_y_b"
-                self.comm.publish_message(
-                    opId_x_a, int_to_bytes(x_a_broadcast.value))
-                self.comm.publish_message(
-                    opId_y_b, int_to_bytes(y_b_broadcast.value))
-                self.sentBytes += len(int_to_bytes(x_a_broadcast.value)) + \
-                    len(int_to_bytes(y_b_broadcast.value))
-                # Wait so that everyone can read on time
-                # time.sleep(1)
-                # Read the shares
-                x_a_sharesList = list()
-                y_b_sharesList = list()
-                for client_id in self.protocol_spec.participant_ids:
-                    # x and a
-                    share_x_a = self.comm.retrieve_public_message(
-                        client_id, opId_x_a)
-                    self.receivedBytes += len(share_x_a)
-                    share_x_a = int_from_bytes(share_x_a)
-                    share_x_a = Share(share_x_a)
-                    x_a_sharesList.append(share_x_a)
-                    # y and b
-                    share_y_b = self.comm.retrieve_public_message(
-                        client_id, opId_y_b)
-                    self.receivedBytes += len(share_y_b)
-                    share_y_b = int_from_bytes(share_y_b)
-                    share_y_b = Share(share_y_b)
-                    y_b_sharesList.append(share_y_b)
-                # Reconstruct the x-a and y-b
-                x_a_re = reconstruct_secret(x_a_sharesList)
-                x_a_re = Share(x_a_re)
-                y_b_re = reconstruct_secret(y_b_sharesList)
-                y_b_re = Share(y_b_re)
-                # 4th step: locally compute the share of z
-                z = share_c + x * y_b_re + y * x_a_re
-                # If I have the ID 0, add additional term -(x-a)(y-b)
-                if self.client_id == self.protocol_spec.participant_ids[0]:
-                    z -= (x_a_re*y_b_re)
-                # print(f"{self.client_id} share_a: {share_a}, share_b: {share_b}, share_c: {share_c} share_x: {x}, share_y: {y}, share_z: {z}, x-a: {x_a_re}, y-b: {y_b_re}")
-                return z
-
-            # Secret - Expression
-            if isinstance(expr.leftExpression, Secret) and expr.rightExpression.containsSecret:
-                right = self.process_expression(expr.rightExpression)
-                # We need to register this
-                b64encoded = base64.b64encode(self.tempBytes)
-                newSecret = Secret(right.value, b64encoded)
-                secretId = newSecret.id
-                self.secretIdDict[secretId.decode("utf-8")] = self.tempClientId
-                self.shareDict[self.tempClientId] = right
-                # Increment the temporary values by 1
-                self.tempClientId = str(int(self.tempClientId)+1)
-                self.tempBytes = int_to_bytes(int_from_bytes(self.tempBytes)+1)
-                # print(self.secretIdDict, self.shareDict)
-                return self.process_expression(Mult(expr.leftExpression, newSecret))
-
-            # Expression - Secret
-            if expr.leftExpression.containsSecret and isinstance(expr.rightExpression, Secret):
-                # print("\n\n\nHello world!\n\n\n")
-                left = self.process_expression(expr.leftExpression)
-                # We need to register this
-                b64encoded = base64.b64encode(self.tempBytes)
-                newSecret = Secret(left.value, b64encoded)
-                secretId = newSecret.id
-                self.secretIdDict[secretId.decode("utf-8")] = self.tempClientId
-                self.shareDict[self.tempClientId] = left
-                # Increment the temporary values by 1
-                self.tempClientId = str(int(self.tempClientId)+1)
-                self.tempBytes = int_to_bytes(int_from_bytes(self.tempBytes)+1)
-                # print("\n\n\n", self.secretIdDict)
-                # print(self.shareDict, "\n\n\n")
-                return self.process_expression(Mult(newSecret, expr.rightExpression))
-
-            # Expression - Expression
-            if expr.leftExpression.containsSecret and expr.rightExpression.containsSecret:
-                left = self.process_expression(expr.leftExpression)
-                # We need to register this
-                b64encoded = base64.b64encode(self.tempBytes)
-                newSecret = Secret(left.value, b64encoded)
-                secretId = newSecret.id
-                self.secretIdDict[secretId.decode("utf-8")] = self.tempClientId
-                self.shareDict[self.tempClientId] = left
-                # Increment the temporary values by 1
-                self.tempClientId = str(int(self.tempClientId)+1)
-                self.tempBytes = int_to_bytes(int_from_bytes(self.tempBytes)+1)
-
-                right = self.process_expression(expr.rightExpression)
-                # We need to register this
-                b64encoded = base64.b64encode(self.tempBytes)
-                newSecret2 = Secret(right.value, b64encoded)
-                secretId = newSecret2.id
-                self.secretIdDict[secretId.decode("utf-8")] = self.tempClientId
-                self.shareDict[self.tempClientId] = right
-                # Increment the temporary values by 1
-                self.tempClientId = str(int(self.tempClientId)+1)
-                self.tempBytes = int_to_bytes(int_from_bytes(self.tempBytes)+1)
-                return self.process_expression(Mult(newSecret, newSecret2))
-
-            # Process further
-            if not expr.leftExpression.containsSecret and not expr.rightExpression.containsSecret:
-                return self.processScalars(expr)
-            if not expr.leftExpression.containsSecret:
-                return self.processScalars(expr.leftExpression) * self.process_expression(expr.rightExpression)
-            if not expr.rightExpression.containsSecret:
-                return self.process_expression(expr.leftExpression) * self.processScalars(expr.rightExpression)
-
-            # Ideally, this should not happen
-            return Share(0)
-
-        if isinstance(expr, Secret):
-            if expr.value is not None:
-                return Share(expr.value)
-            # Get the ID of the secret
-            secretId = expr.id.decode("utf-8")
-            # Map it to the client ID
-            client_id = self.secretIdDict[secretId]
-            # Map it to the share
-            shareVal = self.shareDict[client_id]
-            # Finally, return it
-            return shareVal
-
-        if isinstance(expr, Scalar):
-            if expr.value is not None:
-                return Share(expr.value)
-            return Share(0)
-
-        # This case shouldn't happen
-        raise Exception(
-            "Expression not recognized. Are you sure the input is correct?")
-
-    # Feel free to add as many methods as you want.
+        widths = [len(x) for x, _ in operands]
+        total = FIELD.zeros(2 * sum(widths))
+        for response in responses:
+            total = FIELD.add(total, decode_vector(response))
+        opened = np.split(total, np.cumsum(widths + widths)[:-1])
+        x_a_re, y_b_re = opened[:len(operands)], opened[len(operands):]
+        # Locally compute the share of z for every multiplication
+        isFirst = self.client_id == self.protocol_spec.participant_ids[0]
+        for (x, y), (_, _, share_c), x_a, y_b in zip(operands, triplets, x_a_re, y_b_re):
+            z = FIELD.add(share_c, FIELD.add(
+                FIELD.mul(x, y_b), FIELD.mul(y, x_a)))
+            # If I have the ID 0, add additional term -(x-a)(y-b)
+            if isFirst:
+                z = FIELD.sub(z, FIELD.mul(x_a, y_b))
+            wires.append(z)
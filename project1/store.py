@@ -0,0 +1,129 @@
+"""
+Bounded key-value store of the trusted server, for messages and Beaver triplets.
+
+The values are dropped as soon as all their readers have fetched them. The values that are
+never (fully) fetched, e.g. those of aborted computations, are evicted after a time-to-live,
+or when the store is full, least recently used first. This keeps the memory of a long-running
+server flat across computations.
+"""
+
+import collections
+import threading
+import time
+from typing import Any, Callable, Hashable, Optional, Set
+
+# Default maximum number of entries of a store
+MAX_ENTRIES = 1 << 16
+# Default time in seconds an entry is kept after it was last used
+ENTRY_TTL = 600.0
+
+
+class Entry:
+    """
+    A value of the store.
+
+    Attributes:
+        value: The value, None until it is put
+        readers: Number of readers to wait for before dropping the value (0 keeps it until evicted)
+        fetched: Readers that have fetched the value
+        touched: Time of the last use of the entry
+        event: Event set once the value is put, if the store creates events
+    """
+
+    def __init__(self, event: Any):
+        self.value: Any = None
+        self.readers = 0
+        self.fetched: Set[str] = set()
+        self.touched = time.monotonic()
+        self.event = event
+
+
+class BoundedStore:
+    """
+    A store that drops its values once all their readers fetched them, with LRU and TTL eviction.
+
+    Args:
+        max_entries: Maximum number of entries, the least recently used are evicted beyond it
+        ttl: Time in seconds after which an entry that was not used is evicted
+        event_factory: Constructor of the events set when values are put (e.g. `threading.Event`),
+            to let readers wait for them
+    """
+
+    def __init__(
+        self,
+        max_entries: int = MAX_ENTRIES,
+        ttl: float = ENTRY_TTL,
+        event_factory: Optional[Callable[[], Any]] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.event_factory = event_factory
+        # *entries is ordered from the least to the most recently used entry
+        self.entries: "collections.OrderedDict[Hashable, Entry]" = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self.entries.get(key)
+        return entry is not None and entry.value is not None
+
+    def event(self, key: Hashable) -> Any:
+        """
+        Get the event of a key, set once its value is put.
+        """
+        with self.lock:
+            return self._entry(key).event
+
+    def put(self, key: Hashable, value: Any, readers: int = 0) -> None:
+        """
+        Put the value of a key, to be dropped once `readers` distinct readers fetched it.
+        """
+        with self.lock:
+            entry = self._entry(key)
+            entry.value = value
+            entry.readers = readers
+            entry.fetched.clear()
+            if entry.event is not None:
+                entry.event.set()
+
+    def get(self, key: Hashable, reader: str) -> Any:
+        """
+        Fetch the value of a key for a reader, or None if it is not there (yet).
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.value is None:
+                return None
+            entry.fetched.add(reader)
+            if entry.readers and len(entry.fetched) >= entry.readers:
+                del self.entries[key]
+            else:
+                self._touch(key, entry)
+            return entry.value
+
+    def _entry(self, key: Hashable) -> Entry:
+        entry = self.entries.get(key)
+        if entry is None:
+            self._evict()
+            entry = Entry(self.event_factory()
+                          if self.event_factory is not None else None)
+            self.entries[key] = entry
+        self._touch(key, entry)
+        return entry
+
+    def _touch(self, key: Hashable, entry: Entry) -> None:
+        entry.touched = time.monotonic()
+        self.entries.move_to_end(key)
+
+    def _evict(self) -> None:
+        """
+        Evict the expired entries, and the least recently used ones to make room for a new entry.
+        """
+        deadline = time.monotonic() - self.ttl
+        while self.entries:
+            entry = next(iter(self.entries.values()))
+            if entry.touched >= deadline and len(self.entries) < self.max_entries:
+                break
+            self.entries.popitem(last=False)
@@ -0,0 +1,193 @@
+"""
+Stream transport: the requests of a client to the server are multiplexed as binary frames over
+one persistent TCP (or Unix socket) connection, instead of one HTTP request per message.
+
+Every request carries an ID, and its reply the same ID, so that retrievals waiting for messages
+do not block the other requests of the client. The server holds a retrieval at most
+`session.MAX_WAIT` seconds, and the client asks again for the messages still missing then. The
+frames are described in `wire`, and the server listens for them with `server.serve_stream`.
+"""
+
+import itertools
+import socket
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from metrics import Metrics
+from wire import (
+    decode_messages, decode_triplets, encode_frame, frame_overhead, read_frame,
+    OP_CREATE_SESSION, OP_HELLO, OP_PUBLISH, OP_RETRIEVE_PRIVATE, OP_RETRIEVE_PUBLIC,
+    OP_SEND_PRIVATE, OP_TRIPLETS, STATUS_OK,
+)
+
+
+class StreamError(Exception):
+    """
+    A request failed on the server, or the connection was closed before its reply. Once a
+    request without reply (e.g. a publication) fails, the connection cannot be used anymore.
+    """
+
+
+class StreamCommunication:
+    """
+    Communications with the server over a stream connection, with the API of a `Communication`.
+
+    Attributes:
+        server_host: hostname of the server
+        server_port: port of the stream listener of the server
+        client_id: Identifier of this client
+        session_id: session of the computation on the server (default: the default session)
+        metrics: metrics recording every request (default: new metrics)
+        unix_path: path of a Unix socket to connect to instead of `server_host` and `server_port`
+        pool_size: number of requests `AsyncCommunication` may make concurrently (default: 10)
+    """
+
+    def __init__(
+            self,
+            server_host: str,
+            server_port: int,
+            client_id: str,
+            session_id: Optional[str] = None,
+            metrics: Optional[Metrics] = None,
+            unix_path: Optional[str] = None,
+            pool_size: int = 10
+    ):
+        self.client_id = client_id
+        self.session_id = session_id
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.pool_size = pool_size
+        if unix_path is not None:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(unix_path)
+        else:
+            self.socket = socket.create_connection((server_host, server_port))
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.socket.makefile("rb")
+        self.ids = itertools.count()
+        # Replies not received yet, by request ID
+        self.pending: Dict[int, Future] = dict()
+        self.lock = threading.Lock()
+        # Why the connection cannot be used anymore, once it cannot
+        self.failure: Optional[str] = None
+        threading.Thread(target=self._read_replies, daemon=True).start()
+        self._request(OP_HELLO, [session_id or "", client_id])
+
+    def _read_replies(self) -> None:
+        failure = "Connection closed"
+        try:
+            while True:
+                frame = read_frame(self.reader)
+                if frame is None:
+                    break
+                request_id, status, strings, payload = frame
+                with self.lock:
+                    future = self.pending.pop(request_id, None)
+                message = strings[0] if strings else "Request failed"
+                if future is None:
+                    # Requests without reply are only answered when they fail, and the
+                    # computation cannot go on without the messages they send
+                    failure = f"A message could not be sent: {message}"
+                    break
+                if status == STATUS_OK:
+                    future.set_result((strings, payload))
+                else:
+                    future.set_exception(StreamError(message))
+        except (OSError, ValueError):
+            pass
+        finally:
+            # Whatever stopped the reader, the requests waiting for a reply must not wait forever
+            with self.lock:
+                self.failure = failure
+                pending, self.pending = self.pending, dict()
+            for future in pending.values():
+                future.set_exception(StreamError(failure))
+
+    def _request(self, operation: int, strings: List[str], payload: bytes = b"", reply: bool = False) -> bytes:
+        """
+        Send a request, and wait for its reply if it has one.
+        """
+        future: Future = Future()
+        with self.lock:
+            if self.failure is not None:
+                raise StreamError(self.failure)
+            request_id = next(self.ids)
+            if reply:
+                self.pending[request_id] = future
+            self.socket.sendall(encode_frame(request_id, operation, strings, payload))
+        replyStrings, replyPayload = future.result() if reply else (list(), b"")
+        self.metrics.record_request(
+            payload_sent=len(payload),
+            payload_received=len(replyPayload),
+            header_sent=frame_overhead(strings),
+            header_received=frame_overhead(replyStrings) if reply else 0
+        )
+        return replyPayload
+
+    def close(self) -> None:
+        """
+        Close the connection to the server.
+        """
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.reader.close()
+        self.socket.close()
+
+    def create_session(self, participants: List[str]) -> None:
+        """
+        Create the session of this client on the server, with the given participants. Every
+        participant can create the session, it is only created once.
+        """
+        if self.session_id is None:
+            raise ValueError("The default session cannot be created")
+        self._request(OP_CREATE_SESSION, list(participants), reply=True)
+
+    def send_private_message(self, receiver_id: str, label: str, message: Union[bytes, str]) -> None:
+        self._request(OP_SEND_PRIVATE, [receiver_id, label], _bytes(message))
+
+    def retrieve_private_message(self, label: str) -> bytes:
+        return self.retrieve_private_messages([label])[0]
+
+    def retrieve_private_messages(self, labels: List[str]) -> List[bytes]:
+        return self._retrieve(OP_RETRIEVE_PRIVATE, [[label] for label in labels])
+
+    def publish_message(self, label: str, message: Union[bytes, str]) -> None:
+        self._request(OP_PUBLISH, [label], _bytes(message))
+
+    def retrieve_public_message(self, sender_id: str, label: str) -> bytes:
+        return self.retrieve_public_messages([(sender_id, label)])[0]
+
+    def retrieve_public_messages(self, channels: List[Tuple[str, str]]) -> List[bytes]:
+        return self._retrieve(OP_RETRIEVE_PUBLIC, [list(channel) for channel in channels])
+
+    def _retrieve(self, operation: int, channels: List[List[str]]) -> List[bytes]:
+        """
+        Retrieve several messages, given by the strings of their channels. The server holds a
+        retrieval for a while, and answers it with the messages available by then: the missing
+        messages are asked again until all of them are available.
+        """
+        messages: List[Optional[bytes]] = [None] * len(channels)
+        missing = list(range(len(channels)))
+        while True:
+            strings = [string for i in missing for string in channels[i]]
+            for i, message in zip(missing, decode_messages(self._request(operation, strings, reply=True))):
+                messages[i] = message
+            missing = [i for i, message in enumerate(messages) if message is None]
+            if not missing:
+                return messages  # type: ignore
+            self.metrics.record_poll_retry()
+
+    def retrieve_beaver_triplet_shares(self, op_id: str) -> Tuple[int, int, int]:
+        shares = decode_triplets(self._request(OP_TRIPLETS, [op_id], reply=True))
+        return tuple(int(share[0]) for share in shares)  # type: ignore
+
+    def retrieve_beaver_triplet_vectors(self, op_id: str, count: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return decode_triplets(self._request(OP_TRIPLETS, [op_id, str(count)], reply=True))
+
+
+def _bytes(message: Union[bytes, str]) -> bytes:
+    return message.encode("utf-8") if isinstance(message, str) else message
@@ -2,6 +2,7 @@
 Additional tests
 """
 
+import asyncio
 import time
 from multiprocessing import Process, Queue
 from expression import Scalar, Secret
@@ -25,15 +26,28 @@ def smc_client(client_id, prot, value_dict, queue):
     print(f"{client_id} has finished!")
 
 
+def smc_client_async(client_id, prot, value_dict, queue):
+    cli = SMCParty(
+        client_id,
+        "localhost",
+        5000,
+        protocol_spec=prot,
+        value_dict=value_dict
+    )
+    res = asyncio.run(cli.run_async())
+    queue.put(res)
+    print(f"{client_id} has finished!")
+
+
 def smc_server(args):
     run("localhost", 5000, args)
 
 
-def run_processes(server_args, *client_args):
+def run_processes(server_args, *client_args, client=smc_client):
     queue = Queue()
 
     server = Process(target=smc_server, args=(server_args,))
-    clients = [Process(target=smc_client, args=(*args, queue))
+    clients = [Process(target=client, args=(*args, queue))
                for args in client_args]
 
     server.start()
@@ -59,14 +73,14 @@ def run_processes(server_args, *client_args):
     return results
 
 
-def suite(parties, expr, expected):
+def suite(parties, expr, expected, client=smc_client):
     participants = list(parties.keys())
 
     prot = ProtocolSpec(expr=expr, participant_ids=participants)
     clients = [(name, prot, value_dict)
                for name, value_dict in parties.items()]
 
-    results = run_processes(participants, *clients)
+    results = run_processes(participants, *clients, client=client)
 
     for result in results:
         assert result == expected
@@ -321,6 +335,83 @@ def test13():
     suite(parties, expr, expected)
 
 
+def test14():
+    """
+    f(a, b, c) = (a * b) * (b * c) + c * a * K0
+    """
+    a = Secret()
+    b = Secret()
+    c = Secret()
+    K0 = Scalar(2)
+
+    parties = {
+        "Alice": {a: 3},
+        "Bob": {b: 4},
+        "Charlie": {c: 5},
+    }
+
+    expr = (a * b) * (b * c) + c * a * K0
+    expected = (3*4)*(4*5) + 5*3*2
+    suite(parties, expr, expected)
+
+
+def test15():
+    """
+    f(a, b, c) = a * b + c * K0, on vectors
+    """
+    a = Secret()
+    b = Secret()
+    c = Secret()
+
+    parties = {
+        "Alice": {a: [1, 2, 3, 4]},
+        "Bob": {b: [5, 6, 7, 8]},
+        "Charlie": {c: 10},
+    }
+
+    expr = a * b + c * Scalar(2)
+    expected = [1*5+20, 2*6+20, 3*7+20, 4*8+20]
+    suite(parties, expr, expected)
+
+
+def test16():
+    """
+    f(a0, a1, a2, b) = (a0 + a1) * b - a2, with several secrets per client
+    """
+    a0 = Secret()
+    a1 = Secret()
+    a2 = Secret()
+    b = Secret()
+
+    parties = {
+        "Alice": {a0: 3, a1: 4, a2: [1, 2]},
+        "Bob": {b: 10},
+    }
+
+    expr = (a0 + a1) * b - a2
+    expected = [(3+4)*10-1, (3+4)*10-2]
+    suite(parties, expr, expected)
+
+
+def test17():
+    """
+    f(a, b, c) = (a * b + c) * (a - c) + K0, with the asynchronous client
+    """
+    a = Secret()
+    b = Secret()
+    c = Secret()
+
+    parties = {
+        "Alice": {a: 14},
+        "Bob": {b: 3},
+        "Charlie": {c: [1, 2]},
+    }
+
+    expr = (a * b + c) * (a - c) + Scalar(7)
+    expected = [(14*3+1)*(14-1)+7, (14*3+2)*(14-2)+7]
+    suite(parties, expr, expected, client=smc_client_async)
+
+
 if __name__ == "__main__":
     # test1()
     # test2()
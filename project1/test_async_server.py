@@ -0,0 +1,111 @@
+"""
+Tests of the asyncio trusted server, with the clients running in threads.
+"""
+
+import asyncio
+import http.client
+import socket
+import threading
+import time
+
+from communication import AsyncCommunication, Communication
+from expression import Secret
+from protocol import ProtocolSpec
+from smc_party import SMCParty
+from wire import decode_triplets
+
+
+def test_long_poll(async_server):
+    port = async_server(["Alice", "Bob"])
+    alice = Communication("localhost", port, "Alice")
+    bob = Communication("localhost", port, "Bob")
+
+    def publish():
+        time.sleep(0.2)
+        alice.publish_message("label", b"hello")
+
+    publisher = threading.Thread(target=publish)
+    publisher.start()
+    # Bob's wait does not block Alice's publication
+    assert bob.retrieve_public_message("Alice", "label") == b"hello"
+    publisher.join()
+    assert bob.retrieve_public_messages(
+        [("Alice", "label"), ("Alice", "label")]) == [b"hello", b"hello"]
+    # The asynchronous client retrieves several messages in one request too
+    alice.publish_message("other", b"world")
+    requests = bob.metrics.totals().requests
+    abob = AsyncCommunication(bob)
+    assert asyncio.run(abob.retrieve_public_messages(
+        [("Alice", "label"), ("Alice", "other")])) == [b"hello", b"world"]
+    abob.close()
+    assert bob.metrics.totals().requests == requests + 1
+
+
+def test_suite(async_server, suite):
+    port = async_server(suite.participants)
+    suite(lambda name: Communication("localhost", port, name))
+
+
+def test_sessions(async_server):
+    """Computations with different participants run concurrently on one server."""
+    port = async_server(list())
+    a = Secret()
+    b = Secret()
+    c = Secret()
+    jobs = {
+        "first": ({"Alice": {a: 3}, "Bob": {b: 14}}, a * b, 3*14),
+        "second": ({"Alice": {a: 5}, "Bob": {b: 2}, "Charlie": {c: 7}}, a * b + c, 5*2+7),
+    }
+
+    results = dict()
+
+    def client(session_id, name, prot, value_dict):
+        cli = SMCParty(name, "localhost", port, protocol_spec=prot,
+                       value_dict=value_dict, session_id=session_id)
+        results[(session_id, name)] = cli.run()
+
+    threads = list()
+    for session_id, (parties, expr, _) in jobs.items():
+        prot = ProtocolSpec(expr=expr, participant_ids=list(parties.keys()))
+        threads += [threading.Thread(target=client, args=(session_id, name, prot, value_dict))
+                    for name, value_dict in parties.items()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {(session_id, name): expected
+                       for session_id, (parties, _, expected) in jobs.items()
+                       for name in parties}
+
+
+def test_bad_requests(async_server, bad_requests):
+    """Bad requests are answered with an error, and the connection stays open."""
+    port = async_server(list())
+    connection = http.client.HTTPConnection("localhost", port)
+    connection.request("POST", "/sessions/contract", body=b'{"participants": ["Alice", "Bob"]}')
+    assert connection.getresponse().read() == b""
+    for method, path, body, status in bad_requests:
+        connection.request(method, path, body=body)
+        response = connection.getresponse()
+        response.read()
+        assert response.status == status, path
+    connection.request("GET", "/sessions/contract/shares/Alice/op/2")
+    response = connection.getresponse()
+    assert response.status == 200 and len(decode_triplets(response.read())[0]) == 2
+    connection.close()
+
+
+def test_malformed_requests(async_server):
+    """Requests which cannot be read are answered with an error before the connection is closed."""
+    port = async_server(["Alice", "Bob"])
+    for request, status in [
+        (b"nonsense\r\n\r\n", 400),
+        (b"POST /public/Alice/label HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n5\r\nhello\r\n0\r\n\r\n", 411),
+        (b"POST /public/Alice/label HTTP/1.1\r\nContent-Length: 1000000000000\r\n\r\n", 413),
+        (b"POST /public/Alice/label HTTP/1.1\r\nContent-Length: many\r\n\r\n", 400),
+    ]:
+        with socket.create_connection(("localhost", port)) as sock:
+            sock.sendall(request)
+            response = sock.makefile("rb").read()
+        assert response.startswith(f"HTTP/1.1 {status} ".encode("latin-1"))
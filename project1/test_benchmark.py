@@ -1,77 +1,256 @@
 """
 Benchmarking tests
+
+The computations run on one trusted server per module, which is started on a free port and
+polled until it accepts connections. Every round runs in a new session of the server. The
+matrix runs every computation over HTTP, over the stream transport of the server, and over the
+loopback transport, without any server, which measures the protocol alone.
+
+The timings can be saved as pytest-benchmark JSON baselines, and later runs compared to them:
+
+    python3 -m pytest test_benchmark.py --benchmark-autosave
+    python3 -m pytest test_benchmark.py --benchmark-compare --benchmark-compare-fail=median:10%
+
+The metrics of the clients of every round are appended to the file given by `--metrics-path`
+(by default a temporary file), to be analyzed with `compute_statistics.py`:
+
+    python3 -m pytest test_benchmark.py --metrics-path metrics.jsonl
 """
 
+import json
+import socket
 import time
+import uuid
 from multiprocessing import Process, Queue
-from expression import Scalar, Secret
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pytest
+
+from circuit import compile_expression, linearize
+from expression import Expression, Scalar, Secret, simplify
+from field import FIELD, field_from_name, FIELDS
+from loopback import LoopbackHub
 from protocol import ProtocolSpec
 from server import run
 
 from smc_party import SMCParty
+from stream import StreamCommunication
+
+# Time to wait for the server to accept connections, in seconds
+SERVER_TIMEOUT = 10.0
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(port: int, server: Process) -> None:
+    """Wait until the server accepts connections."""
+    deadline = time.monotonic() + SERVER_TIMEOUT
+    while True:
+        if not server.is_alive():
+            raise RuntimeError("The server exited before accepting connections")
+        try:
+            socket.create_connection(("localhost", port), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.01)
 
 
-def smc_client(client_id, prot, value_dict, queue):
+@pytest.fixture(scope="module")
+def metrics_path(request, tmp_path_factory) -> str:
+    """The file the metrics of the clients are appended to."""
+    return request.config.getoption("--metrics-path") or \
+        str(tmp_path_factory.mktemp("metrics") / "metrics.jsonl")
+
+
+@pytest.fixture(scope="module")
+def server_ports():
+    """The HTTP and stream ports of the server."""
+    port, stream_port = free_port(), free_port()
+    # The participants of the computations are given by their sessions
+    server = Process(target=run, args=("localhost", port, list(), stream_port))
+    server.start()
+    try:
+        wait_until_ready(port, server)
+        wait_until_ready(stream_port, server)
+        yield port, stream_port
+    finally:
+        server.terminate()
+        server.join()
+
+
+def smc_client(client_id, port, session_id, prot, value_dict, queue, transport="http", hub=None):
+    if transport == "loopback":
+        comm = hub.communication(client_id)
+    elif transport == "stream":
+        comm = StreamCommunication("localhost", port, client_id, session_id=session_id)
+    else:
+        comm = None
     cli = SMCParty(
         client_id,
         "localhost",
-        5000,
+        port,
         protocol_spec=prot,
-        value_dict=value_dict
+        value_dict=value_dict,
+        session_id=session_id,
+        comm=comm
     )
     res = cli.run()
-    queue.put(res)
-    print(f"{client_id} has finished!")
-
+    cli.comm.close()
+    queue.put((client_id, res, cli.metrics.to_dict()))
 
-def smc_server(args):
-    run("localhost", 5000, args)
 
-
-def run_processes(server_args, *client_args):
+def run_processes(port, session_id, *client_args, transport="http", hub=None):
     queue = Queue()
 
-    server = Process(target=smc_server, args=(server_args,))
-    clients = [Process(target=smc_client, args=(*args, queue))
+    clients = [Process(target=smc_client,
+                       args=(args[0], port, session_id, *args[1:], queue, transport, hub))
                for args in client_args]
 
-    server.start()
-    time.sleep(3)
     for client in clients:
         client.start()
 
-    results = list()
+    # Read the results before joining, a client only exits once its result is read
+    outputs = [queue.get() for _ in clients]
     for client in clients:
         client.join()
 
-    for client in clients:
-        results.append(queue.get())
-
-    server.terminate()
-    server.join()
-
-    # To "ensure" the workers are dead.
-    time.sleep(2)
+    return outputs
 
-    print("Server stopped.")
 
-    return results
-
-
-def suite(parties, expr, expected):
+def suite(port, parties, expr, expected, metrics_path, labels=None, transport="http"):
+    """
+    Run a computation in a new session, check its result, append the metrics of the clients to
+    `metrics_path` and return them. With the "loopback" transport, the clients communicate
+    through a hub instead of the server.
+    """
     participants = list(parties.keys())
 
     prot = ProtocolSpec(expr=expr, participant_ids=participants)
     clients = [(name, prot, value_dict)
                for name, value_dict in parties.items()]
 
-    results = run_processes(participants, *clients)
+    if transport == "loopback":
+        with LoopbackHub(participants) as hub:
+            outputs = run_processes(None, None, *clients, transport=transport, hub=hub)
+    else:
+        outputs = run_processes(port, uuid.uuid4().hex, *clients, transport=transport)
+
+    allMetrics = list()
+    with open(metrics_path, "a") as f:
+        for client_id, result, metrics in outputs:
+            assert result == expected, client_id
+            metrics["labels"].update(labels or dict())
+            f.write(json.dumps(metrics) + "\n")
+            allMetrics.append(metrics)
+    return allMetrics
+
+
+def record_traffic(benchmark, allMetrics: List[dict]) -> None:
+    """Add the mean traffic of a client in the last round to the benchmark results."""
+    for counter in ("requests", "poll_retries", "payload_sent", "payload_received",
+                    "header_sent", "header_received"):
+        benchmark.extra_info[counter] = float(np.mean(
+            [metrics["totals"][counter] for metrics in allMetrics]))
+
+
+def layered_expression(
+    secrets: List[Secret],
+    values: List[List[int]],
+    multiplications: int,
+    depth: int,
+    fan_in: int
+) -> Tuple[Expression, List[int]]:
+    """
+    Build a sum of chains of `depth` multiplications, with `multiplications` in total (at least
+    one chain). The operands of the multiplications are sums of `fan_in` secrets and a constant,
+    which differs for every operand so that no multiplication is shared. A secret is added to
+    every product of a chain before its next multiplication, so that `simplify` cannot
+    reassociate the chain into a balanced tree, and the chain takes `depth` rounds.
+
+    Returns:
+        Tuple[Expression, List[int]]: The expression, and its value for the `values` of the secrets
+    """
+    width = len(values[0])
+    expr = None
+    expected = [0] * width
+    for chain in range(max(1, multiplications // depth)):
+        product = None
+        productValue = [1] * width
+        for position in range(depth + 1):
+            index = chain * (depth + 1) + position
+            indices = [(index * fan_in + i) % len(secrets) for i in range(fan_in)]
+            operand = Scalar(index + 1)
+            for i in indices:
+                operand = operand + secrets[i]
+            productValue = [
+                value * (index + 1 + sum(values[i][j] for i in indices)) % FIELD.modulus
+                for j, value in enumerate(productValue)]
+            if product is None:
+                product = operand
+            else:
+                product = product * operand + secrets[indices[0]]
+                productValue = [(value + values[indices[0]][j]) % FIELD.modulus
+                                for j, value in enumerate(productValue)]
+        expr = product if expr is None else expr + product
+        expected = [(total + value) % FIELD.modulus
+                    for total, value in zip(expected, productValue)]
+    return expr, expected
+
+
+BASE_CASE = {"parties": 3, "multiplications": 100, "depth": 10, "fan_in": 2, "width": 1}
+AXES = {
+    "parties": [2, 5, 10, 25, 50],
+    "multiplications": [10, 100, 1000],
+    "depth": [1, 10, 100],
+    "fan_in": [1, 8, 64],
+    "width": [1, 100, 1000],
+}
+
 
-    for result in results:
-        assert result == expected
+def benchmark_cases() -> List[Dict[str, int]]:
+    """The base case, and its variations along every axis of the matrix."""
+    cases = [BASE_CASE]
+    for axis, points in AXES.items():
+        cases += [{**BASE_CASE, axis: point} for point in points if point != BASE_CASE[axis]]
+    return cases
 
 
-def performanceTestFunction():
+def case_id(case: Dict[str, int]) -> str:
+    return "-".join(f"{name}{value}" for name, value in case.items())
+
+
+@pytest.mark.parametrize("transport", ["http", "stream", "loopback"])
+@pytest.mark.parametrize("case", benchmark_cases(), ids=case_id)
+def test_matrix(benchmark, server_ports, metrics_path, case, transport):
+    secrets = [Secret() for _ in range(case["parties"])]
+    values = [[(party * case["width"] + i) % 100 + 1 for i in range(case["width"])]
+              for party in range(case["parties"])]
+    expr, expected = layered_expression(
+        secrets, values, case["multiplications"], case["depth"], case["fan_in"])
+    parties = {
+        f"Party{party}": {secret: value if case["width"] > 1 else value[0]}
+        for party, (secret, value) in enumerate(zip(secrets, values))
+    }
+    if case["width"] == 1:
+        expected = expected[0]
+
+    levels = linearize(compile_expression(simplify(expr))).levels
+    benchmark.extra_info.update(case, transport=transport, rounds=sum(1 for mults in levels if mults))
+    port = server_ports[1] if transport == "stream" else server_ports[0]
+    labels = {"benchmark": f"{case_id(case)}-{transport}"}
+    allMetrics = benchmark.pedantic(
+        suite, args=(port, parties, expr, expected, metrics_path, labels, transport), rounds=3, iterations=1)
+    record_traffic(benchmark, allMetrics)
+
+
+def performanceTestFunction(port, metrics_path):
     a = Secret()
     b = Secret()
 
@@ -88,8 +267,24 @@ def performanceTestFunction():
         else:
             expr *= a*b
     expected = 1
-    suite(parties, expr, expected)
+    return suite(port, parties, expr, expected, metrics_path, {"benchmark": "product-chain"})
+
+
+def test_benchmark(benchmark, server_ports, metrics_path):
+    allMetrics = benchmark.pedantic(performanceTestFunction, args=(server_ports[0], metrics_path), rounds=25)
+    record_traffic(benchmark, allMetrics)
+
+
+@pytest.mark.parametrize("name", list(FIELDS))
+def test_gate_throughput(benchmark, name):
+    """Local computation of a batch of Beaver multiplications, in every field"""
+    field = field_from_name(name)
+    x, y, a, b, c = [field.array(np.random.randint(0, min(field.modulus, 1 << 62), size=1 << 16))
+                     for _ in range(5)]
 
+    def gates():
+        x_a = field.sub(x, a)
+        y_b = field.sub(y, b)
+        return field.add(c, field.add(field.mul(x, y_b), field.mul(y, x_a)))
 
-def test_benchmark(benchmark):
-    benchmark.pedantic(performanceTestFunction, rounds=25)
+    benchmark(gates)
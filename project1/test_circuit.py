@@ -0,0 +1,99 @@
+"""
+Unit tests for the compilation of expressions into circuits.
+"""
+
+from circuit import compile_expression, linearize, OP_MULT, OP_SECRET
+from expression import Scalar, Secret
+from secret_sharing import MODULUS
+
+
+def test_hash_consing():
+    """Identical subexpressions are compiled into the same gate."""
+    a = Secret()
+    b = Secret()
+    circuit = compile_expression(a * b + b * a + a * b)
+    assert len(circuit) == 5
+    assert list(circuit.ops).count(OP_SECRET) == 2
+    assert list(circuit.ops).count(OP_MULT) == 1
+
+
+def test_topological_order():
+    a = Secret()
+    b = Secret()
+    circuit = compile_expression((a + Scalar(3)) * (b - a) * Scalar(2))
+    for index in range(len(circuit)):
+        if circuit.right[index] >= 0:
+            assert circuit.left[index] < index
+            assert circuit.right[index] < index
+    assert circuit.output == len(circuit) - 1
+
+
+def test_schedule():
+    """Independent multiplications share a level, dependent ones do not."""
+    a = Secret()
+    b = Secret()
+    c = Secret()
+    circuit = compile_expression(
+        (a * b) * (b * c) + (c + a) * Scalar(3) * a)
+    levels = circuit.schedule()
+    assert [len(mults) for mults, _ in levels] == [0, 3, 1]
+    assert circuit.depth[circuit.output] == 2
+
+
+def test_public_circuit():
+    circuit = compile_expression(Scalar(3) * Scalar(4) + Scalar(5))
+    assert circuit.public[circuit.output]
+    assert circuit.depth[circuit.output] == 0
+
+
+def test_deep_expression():
+    """Long chains are compiled and evaluated without recursion."""
+    a = Secret()
+    b = Secret()
+    expr = a * b
+    for i in range(100000):
+        expr = expr + Scalar(i) if i % 2 else expr * b
+    circuit = compile_expression(expr)
+    assert circuit.depth[circuit.output] == 50001
+
+    expr = Scalar(0)
+    for i in range(100000):
+        expr = expr + a - Scalar(1)
+    circuit = linearize(compile_expression(expr))
+    assert circuit.output.wires == [0]
+    assert circuit.output.coefficients == [100000 % MODULUS]
+    assert circuit.output.constant == -100000 % MODULUS
+
+
+def test_linearize():
+    """Linear subexpressions are collapsed into one form over the wires."""
+    a = Secret()
+    b = Secret()
+    c = Secret()
+    expr = ((a + b) * Scalar(3) - a + Scalar(2)) * (c - Scalar(4) * Scalar(2)) + a - a
+    circuit = linearize(compile_expression(expr))
+    assert circuit.secrets == [a.id, b.id, c.id]
+    assert [len(mults) for mults in circuit.levels] == [0, 1]
+    (leftForm, rightForm), = circuit.levels[1]
+    assert (leftForm.wires, leftForm.coefficients, leftForm.constant) == \
+        ([0, 1], [2, 3], 2)
+    assert (rightForm.wires, rightForm.coefficients, rightForm.constant) == \
+        ([2], [1], MODULUS - 8)
+    # The output is the result of the multiplication, the `a - a` cancels out
+    assert (circuit.output.wires, circuit.output.coefficients,
+            circuit.output.constant) == ([3], [1], 0)
+
+
+def test_linearize_shared():
+    """A linear subexpression shared by many gates is collapsed once, and not modified by them."""
+    xs = [Secret() for _ in range(2000)]
+    total = xs[0]
+    for x in xs[1:]:
+        total = total + x
+    scaled = total * Scalar(2)
+    expr = (total - xs[0]) * xs[1] + scaled * xs[2] + (total + xs[0]) * xs[3]
+    circuit = linearize(compile_expression(expr))
+    (first, _), (second, _), (third, _) = circuit.levels[1]
+    assert first.wires == list(range(1, 2000)) and set(first.coefficients) == {1}
+    assert second.wires == list(range(2000)) and set(second.coefficients) == {2}
+    assert third.coefficients == [2] + [1] * 1999
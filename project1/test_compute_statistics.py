@@ -0,0 +1,47 @@
+"""
+Unit tests for the analysis of the metrics of the clients.
+"""
+
+import numpy as np
+
+from compute_statistics import compare, load, report, summarize
+from metrics import Metrics
+
+
+def write_metrics(path, client, times):
+    with open(path, "a") as f:
+        for wallTime in times:
+            metrics = Metrics({"client": client, "benchmark": "case"})
+            with metrics.phase("round1"):
+                metrics.record_request(payload_sent=10, payload_received=20, header_sent=1, header_received=2)
+            metrics.wall_time = wallTime
+            f.write(metrics.to_json() + "\n")
+
+
+def test_load(tmp_path):
+    write_metrics(tmp_path / "metrics.jsonl", "Alice", [1.0, 2.0])
+    write_metrics(tmp_path / "metrics.jsonl", "Bob", [3.0])
+    # Legacy files have a leading space before the time
+    (tmp_path / "Charlie.txt").write_text(" 4.00 100 200\n 5.00 300 400\n")
+
+    samples = load([str(tmp_path / "metrics.jsonl"), str(tmp_path / "Charlie.txt")])
+    assert len(samples) == 5
+    assert samples.totals["wall_time"].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert samples.totals["payload_received"].tolist() == [20, 20, 20, 100, 300]
+    assert samples.totals["payload_sent"].tolist() == [10, 10, 10, 200, 400]
+    assert samples.phases["round1"]["header_received"].tolist() == [2, 2, 2, 0, 0]
+    groups = samples.groups("client")
+    assert list(groups) == ["Alice", "Bob", "Charlie"]
+    assert groups["Alice"].totals["wall_time"].tolist() == [1.0, 2.0]
+
+    report(samples)
+    compare(groups["Alice"], groups["Charlie"])
+
+
+def test_summarize():
+    summary = summarize(np.arange(1, 101, dtype=float))
+    assert summary["count"] == 100
+    assert (summary["min"], summary["max"], summary["mean"]) == (1, 100, 50.5)
+    assert summary["p50"] == 50.5
+    assert np.isclose(summary["p99"], 99.01)
+    assert summarize(np.zeros(0)) == {"count": 0}
@@ -5,7 +5,14 @@ Testing expressions is not obligatory.
 MODIFY THIS FILE.
 """
 
-from expression import Secret, Scalar
+import multiprocessing
+import os
+import pickle
+
+import pytest
+
+from circuit import compile_expression
+from expression import BinaryOperation, Mult, Secret, Scalar, simplify
 
 
 # Example test, you can adapt it to your needs.
@@ -54,5 +61,110 @@ def testContainExpression():
     assert expr5.containsSecret
 
 
+def testImmutableNodes():
+    a = Secret()
+    expr = a * Scalar(2)
+    assert not hasattr(expr, "__dict__")
+    with pytest.raises(AttributeError):
+        expr.leftExpression = Scalar(3)
+    # Only secrets have an ID
+    assert not hasattr(expr, "id")
+    assert a.id == a.id
+    assert Secret(id=b"given").id == b"given"
+
+
+def testIds():
+    secrets = [Secret() for _ in range(100000)]
+    assert len({secret.id for secret in secrets}) == len(secrets)
+    # Copies of a secret, e.g. in other processes, keep its ID
+    a = Secret()
+    expr = pickle.loads(pickle.dumps(a * Scalar(2) + a))
+    assert expr.rightExpression.id == a.id
+    assert expr.leftExpression.leftExpression is expr.rightExpression
+
+
+def _child_id(queue):
+    queue.put(Secret().id)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def testIdsAfterFork():
+    """Forked processes generate other IDs than their parent and each other."""
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    Secret().id
+    children = [context.Process(target=_child_id, args=(queue,)) for _ in range(2)]
+    for child in children:
+        child.start()
+    ids = [queue.get() for _ in children] + [Secret().id]
+    for child in children:
+        child.join()
+    assert len(set(ids)) == len(ids)
+
+
+def testSimplifyConstants():
+    a = Secret()
+    b = Secret()
+    assert repr(simplify(Scalar(3) * Scalar(4) - Scalar(2))) == "Scalar(10)"
+    assert simplify(a * Scalar(1) + Scalar(0)) is a
+    assert simplify(a - Scalar(5) * Scalar(0)) is a
+    assert repr(simplify((a + b) - (b + a))) == "Scalar(0)"
+    assert repr(simplify(a * b * Scalar(0))) == "Scalar(0)"
+    expr = simplify((a - a) + b * Scalar(2) * Scalar(3))
+    assert repr(expr) == "Secret() * Scalar(6)"
+    assert expr.leftExpression is b
+
+
+def testSimplifyBalancesMultiplications():
+    a = Secret()
+    b = Secret()
+    expr = a * b
+    for _ in range(499):
+        expr *= a * b
+    circuit = compile_expression(simplify(expr))
+    # 1000 factors need 10 levels of multiplications instead of 999
+    assert circuit.depth[circuit.output] == 10
+
+    c = Secret()
+    expr = simplify(((a * b) * c) * Scalar(3))
+    assert isinstance(expr, Mult)
+    assert repr(expr.rightExpression) == "Scalar(3)"
+    assert compile_expression(expr).depth[-1] == 2
+
+
+def distinct_nodes(expr):
+    """The nodes of an expression, each shared node counted once."""
+    nodes = dict()
+    stack = [expr]
+    while stack:
+        node = stack.pop()
+        if id(node) not in nodes:
+            nodes[id(node)] = node
+            if isinstance(node, BinaryOperation):
+                stack += [node.leftExpression, node.rightExpression]
+    return list(nodes.values())
+
+
+def testSimplifyRepeatedSquaring():
+    """Shared products are not expanded into every product using them."""
+    a = Secret()
+    expr = a
+    for _ in range(16):
+        expr = expr * expr
+    simplified = simplify(expr)
+    # Expanding the squares would build 2^16 - 1 multiplications
+    assert sum(isinstance(node, Mult) for node in distinct_nodes(simplified)) == 16
+    circuit = compile_expression(simplified)
+    assert len(circuit) == 17
+    assert circuit.depth[circuit.output] == 16
+
+    b = Secret()
+    square = (a * b) * (a * b)
+    circuit = compile_expression(simplify(square * b * square))
+    # The shared square is computed once, the chain using it is still balanced
+    assert sum(len(mults) for mults, _ in circuit.schedule()) == 4
+    assert circuit.depth[circuit.output] == 4
+
+
 if __name__ == "__main__":
     testContainExpression()
@@ -0,0 +1,54 @@
+"""
+Unit tests for the field arithmetic backends.
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from field import Field, field_from_name, FIELDS
+
+
+@pytest.mark.parametrize("name", list(FIELDS))
+def test_arithmetic(name):
+    """Every backend computes like Python integers modulo its modulus."""
+    field = field_from_name(name)
+    modulus = field.modulus
+    xs = [random.randrange(modulus) for _ in range(1000)] + [0, modulus - 1, 1]
+    ys = [random.randrange(modulus) for _ in range(1000)] + [modulus - 1, modulus - 1, 0]
+    x, y = field.array(xs), field.array(ys)
+    assert x.dtype == field.dtype
+    assert field.add(x, y).tolist() == [(a + b) % modulus for a, b in zip(xs, ys)]
+    assert field.sub(x, y).tolist() == [(a - b) % modulus for a, b in zip(xs, ys)]
+    assert field.mul(x, y).tolist() == [(a * b) % modulus for a, b in zip(xs, ys)]
+    assert field.sum(np.stack([x, y, x])).tolist() == [
+        (2 * a + b) % modulus for a, b in zip(xs, ys)]
+    assert field.linear_combination([3, modulus - 1], [x, y], 7).tolist() == [
+        (7 + 3 * a - b) % modulus for a, b in zip(xs, ys)]
+
+
+@pytest.mark.parametrize("name", list(FIELDS))
+def test_conversion(name):
+    field = field_from_name(name)
+    modulus = field.modulus
+    assert field.array([-5, modulus + 3]).tolist() == [modulus - 5, 3]
+    assert field.array(-1).tolist() == modulus - 1
+    assert int(field.mul(field.array(modulus - 1), field.array(modulus - 1))) == 1
+
+
+def test_unknown_field():
+    with pytest.raises(ValueError):
+        field_from_name("tiny")
+
+
+def test_incomplete_field():
+    """A field must implement the conversion and the arithmetic."""
+    class Incomplete(Field):
+        modulus = 7
+
+        def _convert(self, values):
+            return values % self.modulus
+
+    with pytest.raises(TypeError):
+        Incomplete()
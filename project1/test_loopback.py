@@ -0,0 +1,47 @@
+"""
+Tests of the in-process loopback transport.
+"""
+
+import pytest
+
+from expression import Scalar, Secret
+from loopback import LoopbackHub
+
+
+@pytest.mark.parametrize("mode", ["sync", "async", "processes"])
+def test_suite(suite, mode):
+    with LoopbackHub(suite.participants) as hub:
+        suite(hub.communication, mode)
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_constant_vectors(run_parties, mode):
+    """
+    Expressions which simplify to a constant have the width of the vector inputs.
+    """
+    a = Secret()
+    b = Secret()
+    parties = {
+        "Alice": {a: [1, 2, 3]},
+        "Bob": {b: [4, 5, 6]},
+    }
+    for expr, expected in [((a - a) * Scalar(5) + Scalar(2), [2, 2, 2]), (a * b * Scalar(0), [0, 0, 0])]:
+        with LoopbackHub(list(parties)) as hub:
+            results = run_parties(parties, expr, hub.communication, mode)
+        assert results == {name: expected for name in parties}
+
+
+def test_metrics():
+    """The messages exchanged with the hub are recorded, without header bytes."""
+    with LoopbackHub(["Alice", "Bob"]) as hub:
+        alice = hub.communication("Alice")
+        bob = hub.communication("Bob")
+        alice.publish_message("label", b"hello")
+        assert bob.retrieve_public_messages([("Alice", "label"), ("Alice", "label")]) == [b"hello", b"hello"]
+        a_share, _, _ = alice.retrieve_beaver_triplet_vectors("op", 4)
+        assert len(a_share) == 4
+        with pytest.raises(ValueError):
+            alice.create_session(["Alice", "Charlie"])
+    assert alice.metrics.totals().payload_sent == 5
+    assert bob.metrics.totals().payload_received == 10
+    assert bob.metrics.totals().header_received == 0
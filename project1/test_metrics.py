@@ -0,0 +1,72 @@
+"""
+Unit tests for the metrics of the clients.
+"""
+
+import json
+
+from communication import Communication
+from expression import Secret
+from metrics import DEFAULT_PHASE, Metrics
+
+
+def test_phases():
+    metrics = Metrics({"client": "Alice"})
+    metrics.record_request(payload_sent=1, payload_received=2, header_sent=3, header_received=4)
+    with metrics.phase("round0"):
+        metrics.record_request(payload_sent=10, payload_received=20, header_sent=30, header_received=40)
+        metrics.record_poll_retry()
+        metrics.record_request(payload_sent=10, payload_received=20, header_sent=30, header_received=40)
+    assert metrics.current == DEFAULT_PHASE
+    assert list(metrics.phases) == [DEFAULT_PHASE, "round0"]
+    phase = metrics.phases["round0"]
+    assert (phase.requests, phase.poll_retries, phase.payload_sent, phase.header_received) == (2, 1, 20, 80)
+    assert phase.wall_time > 0
+    totals = metrics.totals()
+    assert (totals.requests, totals.payload_received, totals.header_sent) == (3, 42, 63)
+
+
+def test_exports():
+    metrics = Metrics({"client": "Alice"})
+    with metrics.phase("inputs"):
+        metrics.record_request(payload_sent=5, payload_received=6, header_sent=7, header_received=8)
+    metrics.wall_time = 1.5
+
+    exported = json.loads(metrics.to_json())
+    assert exported["labels"] == {"client": "Alice"}
+    assert exported["wall_time"] == 1.5
+    assert exported["phases"]["inputs"]["payload_sent"] == 5
+    assert exported["totals"]["requests"] == 1
+    assert "\n" not in metrics.to_json()
+
+    text = metrics.to_prometheus()
+    assert 'smc_wall_seconds{client="Alice"} 1.5' in text
+    assert 'smc_payload_received_bytes_total{client="Alice",phase="inputs"} 6' in text
+    assert "# TYPE smc_requests_total counter" in text
+
+
+def test_party_phases(async_server, run_parties):
+    """The requests of a computation are recorded by protocol phase."""
+    port = async_server(["Alice", "Bob"])
+    a = Secret()
+    b = Secret()
+    comms = dict()
+
+    def transport(name):
+        comms[name] = Communication("localhost", port, name)
+        return comms[name]
+
+    run_parties({"Alice": {a: 3}, "Bob": {b: 14}}, a * b * a, transport)
+
+    metrics = comms["Alice"].metrics
+    phases = list(metrics.phases)
+    # One phase per multiplication round
+    assert phases[:2] == ["inputs", "preprocessing"] and phases[-1] == "output"
+    rounds = phases[2:-1]
+    assert len(rounds) == 2 and all(name.startswith("round") for name in rounds)
+    for phase in metrics.phases.values():
+        assert phase.requests > 0 and phase.header_sent > 0 and phase.header_received > 0
+    # The masked operands of a round are published and retrieved
+    assert metrics.phases[rounds[0]].payload_sent > 0
+    assert metrics.phases[rounds[0]].payload_received > 0
+    totals = metrics.totals()
+    assert totals.wall_time == metrics.wall_time > 0
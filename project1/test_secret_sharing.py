@@ -6,7 +6,16 @@ MODIFY THIS FILE.
 """
 
 
-from secret_sharing import reconstruct_secret, share_secret
+import numpy as np
+import pytest
+
+from field import FIELD
+from secret_sharing import (
+    generate_triplets, MODULUS, random_elements, reconstruct_secret,
+    reconstruct_secret_vector, share_secret, share_secret_batch,
+    share_secret_vector, Share, ShareVector,
+)
+from wire import decode_vector, encode_vector
 
 
 def test():
@@ -14,5 +23,39 @@ def test():
     print(reconstruct_secret(share_secret(10, 3)))
 
 
+def test_vector():
+    secret = [10, 0, 7918, 42]
+    shares = share_secret_vector(secret, 3)
+    assert len(shares) == 3
+    assert reconstruct_secret_vector(shares) == secret
+    assert decode_vector(encode_vector(shares[1].values)).tolist() == shares[1].values.tolist()
+    assert reconstruct_secret_vector(
+        [shares[0] + shares[1] + shares[2], shares[0] - shares[0]]) == secret
+
+
+def test_immutable():
+    share = Share(3)
+    vector = ShareVector([1, 2])
+    with pytest.raises(AttributeError):
+        share.value = 4
+    with pytest.raises(AttributeError):
+        vector.values = FIELD.array([3, 4])
+    with pytest.raises(AttributeError):
+        vector.other = 1
+    assert (share.value, vector.values.tolist()) == (3, [1, 2])
+
+
+def test_batch():
+    elements = random_elements((4, 1000))
+    assert elements.shape == (4, 1000)
+    assert 0 <= int(elements.min()) and int(elements.max()) < MODULUS
+    secrets = [[1, 2, 3], [MODULUS - 1, 0, 5]]
+    shares = share_secret_batch(secrets, 3)
+    assert shares.shape == (3, 2, 3)
+    assert FIELD.sum(shares).tolist() == secrets
+    a, b, c = FIELD.sum(generate_triplets(100, 3), axis=1)
+    assert np.array_equal(FIELD.mul(a, b), c)
+
+
 if __name__ == "__main__":
     test()
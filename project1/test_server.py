@@ -0,0 +1,93 @@
+"""
+Unit tests for the trusted server.
+"""
+
+import threading
+import time
+
+from server import app, sessions
+from wire import decode_messages, decode_triplets
+
+
+def test_long_poll():
+    """A retrieval waits until the message is published."""
+    client = app.test_client()
+    assert client.get("/public/Bob/Alice/waiting").status_code == 404
+
+    def publish():
+        time.sleep(0.2)
+        app.test_client().post("/public/Alice/waiting", data=b"hello")
+
+    publisher = threading.Thread(target=publish)
+    publisher.start()
+    startTime = time.time()
+    res = client.get("/public/Bob/Alice/waiting?timeout=5")
+    publisher.join()
+    assert res.status_code == 200
+    assert res.data == b"hello"
+    assert time.time() - startTime < 5
+
+
+def test_long_poll_timeout():
+    client = app.test_client()
+    startTime = time.time()
+    res = client.get("/private/Bob/never?timeout=0.3")
+    assert res.status_code == 404
+    assert time.time() - startTime >= 0.3
+
+
+def test_bulk_retrieval():
+    """Several messages are retrieved in one request, in the requested order."""
+    client = app.test_client()
+    client.post("/public/Alice/bulk_label", data=b"from Alice")
+    client.post("/public/Bob/bulk_label", data=b"")
+    res = client.post("/bulk/public/Charlie", json={
+        "channels": [["Bob", "bulk_label"], ["Alice", "bulk_label"], ["David", "bulk_label"]],
+        "timeout": 0.1
+    })
+    assert res.status_code == 200
+    assert decode_messages(res.data) == [b"", b"from Alice", None]
+
+    client.post("/private/Alice/Charlie/Alice", data=b"private")
+    res = client.post("/bulk/private/Charlie", json={"labels": ["Alice"]})
+    assert decode_messages(res.data) == [b"private"]
+
+
+def test_sessions():
+    """Sessions are created once, and their messages are isolated."""
+    client = app.test_client()
+    assert client.post("/sessions/job/public/Alice/label",
+                       data=b"x").status_code == 404
+    assert client.post("/sessions/job",
+                       json={"participants": ["Alice", "Bob"]}).status_code == 200
+    assert client.post("/sessions/job",
+                       json={"participants": ["Bob", "Alice"]}).status_code == 200
+    assert client.post("/sessions/job",
+                       json={"participants": ["Alice"]}).status_code == 409
+
+    client.post("/sessions/job/public/Alice/label", data=b"in session")
+    assert client.get("/public/Bob/Alice/label").status_code == 404
+    assert client.get("/sessions/job/public/Bob/Alice/label").data == b"in session"
+    res = client.get("/sessions/job/shares/Alice/op/3")
+    assert len(decode_triplets(res.data)[0]) == 3
+
+
+def test_bad_requests(bad_requests):
+    """Bad requests are answered with the same errors as on the asyncio server."""
+    client = app.test_client()
+    assert client.post("/sessions/contract",
+                       json={"participants": ["Alice", "Bob"]}).status_code == 200
+    for method, path, body, status in bad_requests:
+        assert client.open(path, method=method, data=body).status_code == status, path
+
+
+def test_session_pool():
+    """A session generates its triplets when they are requested, not when it is created."""
+    client = app.test_client()
+    assert client.post("/sessions/lazy",
+                       json={"participants": ["Alice", "Bob"]}).status_code == 200
+    ttp = sessions.get("lazy").ttp
+    assert ttp.pool.shape[2] == 0
+    res = client.get("/sessions/lazy/shares/Alice/op/5000")
+    assert len(decode_triplets(res.data)[0]) == 5000
+    assert ttp.pool.shape[2] < 5000
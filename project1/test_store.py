@@ -0,0 +1,48 @@
+"""
+Unit tests for the bounded store of the trusted server.
+"""
+
+import threading
+import time
+
+from store import BoundedStore
+
+
+def test_readers():
+    """A value is dropped once all its readers fetched it."""
+    store = BoundedStore()
+    store.put("key", b"value", readers=2)
+    assert store.get("key", "Alice") == b"value"
+    # Fetching again does not count as another reader
+    assert store.get("key", "Alice") == b"value"
+    assert len(store) == 1
+    assert store.get("key", "Bob") == b"value"
+    assert len(store) == 0
+    assert store.get("key", "Charlie") is None
+
+
+def test_lru():
+    store = BoundedStore(max_entries=2)
+    store.put("a", 1)
+    store.put("b", 2)
+    store.get("a", "Alice")
+    store.put("c", 3)
+    assert "a" in store and "c" in store
+    assert "b" not in store
+
+
+def test_ttl():
+    store = BoundedStore(ttl=0.1)
+    store.put("old", 1)
+    time.sleep(0.2)
+    store.put("new", 2)
+    assert "old" not in store
+    assert store.get("new", "Alice") == 2
+
+
+def test_event():
+    store = BoundedStore(event_factory=threading.Event)
+    event = store.event("key")
+    assert not event.is_set() and "key" not in store
+    store.put("key", b"value")
+    assert event.is_set()
@@ -0,0 +1,134 @@
+"""
+Tests of the stream transport, with the listener of the server and the clients in threads.
+"""
+
+import socket
+import threading
+import time
+import uuid
+
+import pytest
+
+import server
+from server import serve_stream
+from stream import StreamCommunication, StreamError
+from wire import read_frame, FRAME_HEADER
+
+
+@pytest.fixture(scope="module")
+def stream_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        port = sock.getsockname()[1]
+    listener = serve_stream("localhost", port)
+    yield port
+    listener.shutdown()
+    listener.server_close()
+
+
+def connect(port, client_id, session_id):
+    return StreamCommunication("localhost", port, client_id, session_id=session_id)
+
+
+def test_multiplexing(stream_port):
+    """A waiting retrieval does not hold up the other requests of the connection."""
+    session_id = uuid.uuid4().hex
+    alice = connect(stream_port, "Alice", session_id)
+    bob = connect(stream_port, "Bob", session_id)
+    alice.create_session(["Alice", "Bob"])
+    bob.create_session(["Alice", "Bob"])
+
+    results = dict()
+    waiting = threading.Thread(target=lambda: results.update(
+        alice=alice.retrieve_public_messages([("Bob", "late"), ("Alice", "early")])))
+    waiting.start()
+    with alice.metrics.phase("publish"):
+        alice.publish_message("early", b"first")
+    alice.send_private_message("Bob", "Alice", b"private")
+    assert bob.retrieve_private_message("Alice") == b"private"
+    bob.publish_message("late", b"second")
+    waiting.join()
+    assert results["alice"] == [b"second", b"first"]
+    assert len(alice.retrieve_beaver_triplet_vectors("op", 5)[0]) == 5
+
+    # A few bytes of framing per message
+    phase = alice.metrics.phases["publish"]
+    assert (phase.requests, phase.payload_sent) == (1, len(b"first"))
+    assert phase.header_sent < 20
+
+    with pytest.raises(StreamError):
+        connect(stream_port, "Charlie", session_id).create_session(["Alice", "Charlie"])
+    alice.close()
+    bob.close()
+
+
+def test_bounded_wait(stream_port, monkeypatch):
+    """The server holds a retrieval a bounded time, and the client asks again for the missing messages."""
+    monkeypatch.setattr(server, "MAX_WAIT", 0.1)
+    session_id = uuid.uuid4().hex
+    alice = connect(stream_port, "Alice", session_id)
+    bob = connect(stream_port, "Bob", session_id)
+    alice.create_session(["Alice", "Bob"])
+    alice.publish_message("early", b"first")
+    publisher = threading.Timer(0.5, bob.publish_message, args=("late", b"second"))
+    publisher.start()
+    assert bob.retrieve_public_messages([("Alice", "early"), ("Bob", "late")]) == [b"first", b"second"]
+    assert bob.metrics.totals().poll_retries >= 2
+    publisher.join()
+    alice.close()
+    bob.close()
+
+
+def test_failed_publication(stream_port):
+    """A publication which fails on the server is answered, and the connection cannot be used anymore."""
+    alice = connect(stream_port, "Alice", uuid.uuid4().hex)
+    alice.publish_message("label", b"hello")
+    deadline = time.monotonic() + 5
+    while alice.failure is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert "Unknown session" in alice.failure
+    with pytest.raises(StreamError):
+        alice.retrieve_public_message("Alice", "label")
+    alice.close()
+
+
+def test_truncated_reply():
+    """A connection dropped within a reply fails the waiting requests instead of blocking them."""
+    with socket.socket() as server:
+        server.bind(("localhost", 0))
+        server.listen()
+
+        def reply_partially():
+            connection, _ = server.accept()
+            with connection, connection.makefile("rb") as reader:
+                read_frame(reader)
+                request_id = read_frame(reader)[0]
+                connection.sendall(FRAME_HEADER.pack(20, request_id, 0))
+
+        thread = threading.Thread(target=reply_partially)
+        thread.start()
+        alice = StreamCommunication("localhost", server.getsockname()[1], "Alice")
+        with pytest.raises(StreamError):
+            alice.retrieve_public_message("Bob", "label")
+        thread.join()
+        alice.close()
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_suite(stream_port, suite, mode):
+    session_id = uuid.uuid4().hex
+    suite(lambda name: connect(stream_port, name, session_id), mode, session_id)
+
+
+def test_unix_socket(tmp_path):
+    path = str(tmp_path / "smc.sock")
+    listener = serve_stream("", 0, unix_path=path)
+    try:
+        alice = StreamCommunication("", 0, "Alice", session_id="unix", unix_path=path)
+        alice.create_session(["Alice"])
+        alice.publish_message("label", b"hello")
+        assert alice.retrieve_public_message("Alice", "label") == b"hello"
+        alice.close()
+    finally:
+        listener.shutdown()
+        listener.server_close()
@@ -5,8 +5,8 @@ Testing ttp is not obligatory.
 MODIFY THIS FILE.
 """
 
-from secret_sharing import reconstruct_secret
-from ttp import TrustedParamGenerator
+from secret_sharing import MODULUS, reconstruct_secret, reconstruct_secret_vector
+from ttp import POOL_BATCH, TrustedParamGenerator
 from secret_sharing import Share
 
 
@@ -30,6 +30,42 @@ def test():
     assert (a_reconstructed*b_reconstructed).value == c_reconstructed.value
 
 
+def test_vectors():
+    """Beaver triplet generation, as vectors"""
+    myTTP = TrustedParamGenerator()
+    myTTP.add_participant("Alice")
+    myTTP.add_participant("Bob")
+    sharesAlice = myTTP.retrieve_share_vectors("Alice", "op", 5)
+    sharesBob = myTTP.retrieve_share_vectors("Bob", "op", 5)
+    a, b, c = [reconstruct_secret_vector([x, y])
+               for x, y in zip(sharesAlice, sharesBob)]
+    assert len(c) == 5
+    assert [(x*y) % MODULUS for x, y in zip(a, b)] == c
+
+
+def test_pool():
+    """Triplets are served from a pool, which is refilled in batches when it runs out"""
+    myTTP = TrustedParamGenerator()
+    myTTP.add_participant("Alice")
+    myTTP.add_participant("Bob")
+    assert myTTP.pool.shape == (3, 2, 0)
+    sharesAlice = myTTP.retrieve_share_vectors("Alice", "first", 8)
+    assert myTTP.pool.shape == (3, 2, POOL_BATCH - 8)
+    # The pool is refilled with a batch, as it holds fewer triplets than requested
+    sharesAlice += myTTP.retrieve_share_vectors("Alice", "second", POOL_BATCH)
+    assert myTTP.pool.shape == (3, 2, POOL_BATCH - 8)
+    sharesBob = myTTP.retrieve_share_vectors("Bob", "first", 8) + \
+        myTTP.retrieve_share_vectors("Bob", "second", POOL_BATCH)
+    a, b, c = [reconstruct_secret_vector([x, y]) for x, y in zip(
+        sharesAlice[:3], sharesBob[:3])]
+    assert len(c) == 8
+    assert [(x*y) % MODULUS for x, y in zip(a, b)] == c
+    a, b, c = [reconstruct_secret_vector([x, y]) for x, y in zip(
+        sharesAlice[3:], sharesBob[3:])]
+    assert len(c) == POOL_BATCH
+    assert [(x*y) % MODULUS for x, y in zip(a, b)] == c
+
+
 def secretMult():
     """Sample x*y protocol"""
     myTTP = TrustedParamGenerator()
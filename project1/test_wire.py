@@ -0,0 +1,55 @@
+"""
+Unit tests for the binary wire format.
+"""
+
+import io
+
+import pytest
+
+from secret_sharing import MODULUS, SHARE_BYTES, Share
+from wire import (
+    decode_messages, decode_share, decode_triplets, decode_vector,
+    encode_frame, encode_messages, encode_share, encode_triplets, encode_vector,
+    encoded_size, read_frame, FRAME_HEADER, HEADER, WIRE_VERSION,
+)
+
+
+def test_round_trip():
+    assert decode_share(encode_share(Share(7918))).value == 7918
+    values = [0, 1, MODULUS - 1, 42]
+    assert decode_vector(encode_vector(values)).tolist() == values
+    a, b, c = decode_triplets(encode_triplets([1, 2], [3, 4], [5, 6]))
+    assert (a.tolist(), b.tolist(), c.tolist()) == ([1, 2], [3, 4], [5, 6])
+    messages = [b"", None, b"payload"]
+    assert decode_messages(encode_messages(messages)) == messages
+
+
+def test_fixed_width():
+    """Every element takes the same number of bytes, whatever its value."""
+    assert len(encode_vector([0, 0])) == len(encode_vector([MODULUS - 1, 1])) == encoded_size(2)
+    assert encoded_size(0) == HEADER.size
+    assert encoded_size(1) == HEADER.size + SHARE_BYTES
+
+
+def test_mismatch():
+    payload = encode_vector([1, 2, 3])
+    with pytest.raises(ValueError):
+        decode_triplets(payload)
+    with pytest.raises(ValueError):
+        decode_vector(bytes([WIRE_VERSION + 1]) + payload[1:])
+    with pytest.raises(ValueError):
+        decode_vector(payload[:-1])
+
+
+def test_truncated_frame():
+    """A stream ending within a frame is an error, and at a frame boundary is its end."""
+    frame = encode_frame(7, 3, ["Alice", "label"], b"payload")
+    stream = io.BytesIO(frame + frame)
+    assert read_frame(stream) == (7, 3, ["Alice", "label"], b"payload")
+    assert read_frame(stream) == (7, 3, ["Alice", "label"], b"payload")
+    assert read_frame(stream) is None
+    for length in range(1, len(frame)):
+        with pytest.raises(ValueError):
+            read_frame(io.BytesIO(frame[:length]))
+    with pytest.raises(ValueError):
+        read_frame(io.BytesIO(FRAME_HEADER.pack(20, 1, 0)))
@@ -4,57 +4,111 @@ Trusted parameters generator.
 MODIFY THIS FILE.
 """
 
-import random
+import threading
 from typing import (
-    Dict, List,
+    Dict,
     Set,
     Tuple,
 )
 
+import numpy as np
+
+from field import FIELD
 from secret_sharing import(
-    MODULUS, share_secret,
-    Share,
+    generate_triplets,
+    Share, ShareVector,
 )
+from store import BoundedStore, ENTRY_TTL
 
 # Feel free to add as many imports as you want.
 
 
+# Minimum number of triplets generated when the pool runs out, so that requests for single
+# triplets do not each generate one
+POOL_BATCH = 1 << 8
+# Maximum number of operations whose triplets are kept until all the participants fetched them
+MAX_OPERATIONS = 1 << 14
+
+
 class TrustedParamGenerator:
     """
     A trusted third party that generates random values for the Beaver triplet multiplication scheme.
+
+    The triplets are drawn from a pool, generated in bulk when a request needs more triplets
+    than the pool holds. The triplets of an operation are dropped once every participant
+    fetched its shares, or once they expire (see `BoundedStore`).
     """
 
-    def __init__(self):
+    def __init__(self, max_operations: int = MAX_OPERATIONS, ttl: float = ENTRY_TTL):
         self.participant_ids: Set[str] = set()
-        self.operationDict: Dict[str, Tuple[List[Share],
-                                            List[Share], List[Share]]] = dict()
+        # *participantIndex maps every participant to the index of its shares
+        self.participantIndex: Dict[str, int] = dict()
+        # The server retrieves shares for several clients concurrently
+        self.lock = threading.Lock()
+        # *pool holds the shares of the unused triplets, indexed by (a/b/c, participant, triplet)
+        self.pool = FIELD.zeros((3, 0, 0))
+        # *operationDict maps the operation IDs to the shares of their triplets, as stored in the pool
+        self.operationDict = BoundedStore(max_operations, ttl)
+        self.vectorOperationDict = BoundedStore(max_operations, ttl)
 
     def add_participant(self, participant_id: str) -> None:
         """
         Add a participant.
         """
-        self.participant_ids.add(participant_id)
+        with self.lock:
+            self.participant_ids.add(participant_id)
+            self.participantIndex = {participant: index for index, participant
+                                     in enumerate(sorted(self.participant_ids))}
+            # The triplets generated so far are shared among the wrong number of participants
+            self.pool = FIELD.zeros((3, len(self.participant_ids), 0))
+
+    def _generate(self, count: int) -> None:
+        """
+        Generate `count` triplets in bulk and add them to the pool.
+        """
+        shares = generate_triplets(count, len(self.participant_ids))
+        self.pool = np.concatenate([self.pool, shares], axis=2)
+
+    def _take(self, count: int) -> np.ndarray:
+        """
+        Remove `count` triplets from the pool, refilling it if needed.
+        """
+        if self.pool.shape[2] < count:
+            self._generate(max(count - self.pool.shape[2], POOL_BATCH))
+        triplets, self.pool = self.pool[:, :, :count], self.pool[:, :, count:]
+        return triplets
 
     def retrieve_share(self, client_id: str, op_id: str) -> Tuple[Share, Share, Share]:
         """
         Retrieve a triplet of shares for a given client_id.
         """
-        participantsList = sorted(list(self.participant_ids))
-        index = participantsList.index(client_id)
-        # If we have already calculated the shares
-        if op_id in self.operationDict:
-            a_shares, b_shares, c_shares = self.operationDict[op_id]
-            return a_shares[index], b_shares[index], c_shares[index]
-        # Else, calculate them here and return the relevant shares
-        a = random.randrange(0, MODULUS)
-        b = random.randrange(0, MODULUS)
-        c = (a*b) % MODULUS
-        a_shares = share_secret(a, len(self.participant_ids))
-        b_shares = share_secret(b, len(self.participant_ids))
-        c_shares = share_secret(c, len(self.participant_ids))
-        self.operationDict[op_id] = a_shares, b_shares, c_shares
-        #print(f"\n\n\nTTP, a: {a}, b: {b}, c: {c}")
-        #print(a_shares, b_shares, c_shares, "\n\n\n")
-        return a_shares[index], b_shares[index], c_shares[index]
+        with self.lock:
+            return self._retrieve_share(client_id, op_id)
+
+    def _retrieve_share(self, client_id: str, op_id: str) -> Tuple[Share, Share, Share]:
+        index = self.participantIndex[client_id]
+        if op_id not in self.operationDict:
+            self.operationDict.put(
+                op_id, self._take(1), len(self.participant_ids))
+        a, b, c = self.operationDict.get(op_id, client_id)[:, index, 0]
+        return Share(int(a)), Share(int(b)), Share(int(c))
+
+    def retrieve_share_vectors(self, client_id: str, op_id: str, count: int) -> Tuple[ShareVector, ShareVector, ShareVector]:
+        """
+        Retrieve the shares of `count` triplets for a given client_id, as vectors (a, b, c).
+
+        This lets a client download the triplets of a whole computation in one request,
+        before it starts.
+        """
+        with self.lock:
+            return self._retrieve_share_vectors(client_id, op_id, count)
+
+    def _retrieve_share_vectors(self, client_id: str, op_id: str, count: int) -> Tuple[ShareVector, ShareVector, ShareVector]:
+        index = self.participantIndex[client_id]
+        if op_id not in self.vectorOperationDict:
+            self.vectorOperationDict.put(
+                op_id, self._take(count), len(self.participant_ids))
+        a, b, c = self.vectorOperationDict.get(op_id, client_id)[:, index]
+        return ShareVector(a), ShareVector(b), ShareVector(c)
 
     # Feel free to add as many methods as you want.
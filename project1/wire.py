@@ -0,0 +1,205 @@
+"""
+Binary wire format of the messages exchanged between the clients and the server.
+
+Shares, vectors of shares and batches of triplets are packed as a fixed-width little-endian
+array of field elements after a small header:
+
+    version (1 byte) | kind (1 byte) | element width in bytes (1 byte) | count (4 bytes)
+
+so that they can be decoded into NumPy arrays without copy when the wire type is the type
+of the field elements (e.g. 8-byte elements on little-endian machines). The results of bulk retrievals
+are a list of length-prefixed messages after a version byte.
+
+The stream transport multiplexes the requests of a client over one connection, as frames:
+
+    length of the rest of the frame (4 bytes) | request ID (4 bytes) | code (1 byte) |
+    number of strings (2 bytes) | length-prefixed UTF-8 strings (2 bytes each) | payload
+
+where the code is the operation of a request, or the status of its reply.
+"""
+
+import struct
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from field import FIELD
+from secret_sharing import SHARE_BYTES, Share
+
+WIRE_VERSION = 1
+
+# Kinds of payloads
+KIND_SHARE = 0
+KIND_VECTOR = 1
+KIND_TRIPLETS = 2
+
+HEADER = struct.Struct("<BBBI")
+# NumPy type of a field element on the wire
+WIRE_DTYPE = np.dtype(f"<u{SHARE_BYTES}")
+
+MESSAGES_HEADER = struct.Struct("<BI")
+MESSAGE_LENGTH = struct.Struct("<i")
+
+FRAME_HEADER = struct.Struct("<IIB")
+STRING_LENGTH = struct.Struct("<H")
+# Operations of the requests of the stream transport
+OP_HELLO = 0
+OP_CREATE_SESSION = 1
+OP_SEND_PRIVATE = 2
+OP_PUBLISH = 3
+OP_RETRIEVE_PRIVATE = 4
+OP_RETRIEVE_PUBLIC = 5
+OP_TRIPLETS = 6
+# Statuses of the replies
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+
+def encoded_size(count: int) -> int:
+    """Number of bytes of an encoded payload of `count` field elements."""
+    return HEADER.size + count * SHARE_BYTES
+
+
+def _encode(kind: int, values: np.ndarray, count: int) -> bytes:
+    return HEADER.pack(WIRE_VERSION, kind, SHARE_BYTES, count) + values.astype(WIRE_DTYPE).tobytes()
+
+
+def _decode(kind: int, xbytes: bytes) -> Tuple[np.ndarray, int]:
+    if len(xbytes) < HEADER.size:
+        raise ValueError("Payload too short for its header")
+    version, payloadKind, width, count = HEADER.unpack_from(xbytes)
+    if version != WIRE_VERSION:
+        raise ValueError(f"Unsupported wire format version {version}")
+    if payloadKind != kind or width != SHARE_BYTES:
+        raise ValueError(
+            f"Expected a payload of kind {kind} with {SHARE_BYTES}-byte elements, got kind {payloadKind} with {width}-byte elements")
+    values = np.frombuffer(xbytes, dtype=WIRE_DTYPE, offset=HEADER.size)
+    return values.astype(FIELD.dtype, copy=False), count
+
+
+def encode_share(share: Share) -> bytes:
+    """Encode a single share."""
+    return _encode(KIND_SHARE, FIELD.array([share.value]), 1)
+
+
+def decode_share(xbytes: bytes) -> Share:
+    """Decode a share encoded with `encode_share`."""
+    values, _ = _decode(KIND_SHARE, xbytes)
+    if len(values) != 1:
+        raise ValueError("A share payload must hold exactly one element")
+    return Share(int(values[0]))
+
+
+def encode_vector(values: np.ndarray) -> bytes:
+    """Encode a vector of shares."""
+    values = FIELD.array(values)
+    return _encode(KIND_VECTOR, values, len(values))
+
+
+def decode_vector(xbytes: bytes) -> np.ndarray:
+    """Decode a vector encoded with `encode_vector`."""
+    values, count = _decode(KIND_VECTOR, xbytes)
+    if len(values) != count:
+        raise ValueError(
+            f"Expected {count} elements, got {len(values)}")
+    return values
+
+
+def encode_triplets(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> bytes:
+    """Encode the shares of a batch of triplets, as the vector of a's, then b's, then c's."""
+    a, b, c = FIELD.array(a), FIELD.array(b), FIELD.array(c)
+    return _encode(KIND_TRIPLETS, np.concatenate([a, b, c]), len(a))
+
+
+def decode_triplets(xbytes: bytes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Decode a batch of triplets encoded with `encode_triplets`, as the vectors (a, b, c)."""
+    values, count = _decode(KIND_TRIPLETS, xbytes)
+    if len(values) != 3 * count:
+        raise ValueError(
+            f"Expected {3 * count} elements, got {len(values)}")
+    return values[:count], values[count:2*count], values[2*count:]
+
+
+def encode_messages(messages: List[Optional[bytes]]) -> bytes:
+    """Encode a list of messages, where None stands for a missing message."""
+    parts = [MESSAGES_HEADER.pack(WIRE_VERSION, len(messages))]
+    for message in messages:
+        if message is None:
+            parts.append(MESSAGE_LENGTH.pack(-1))
+        else:
+            parts.append(MESSAGE_LENGTH.pack(len(message)))
+            parts.append(message)
+    return b"".join(parts)
+
+
+def decode_messages(xbytes: bytes) -> List[Optional[bytes]]:
+    """Decode a list of messages encoded with `encode_messages`."""
+    version, count = MESSAGES_HEADER.unpack_from(xbytes)
+    if version != WIRE_VERSION:
+        raise ValueError(f"Unsupported wire format version {version}")
+    view = memoryview(xbytes)
+    offset = MESSAGES_HEADER.size
+    messages: List[Optional[bytes]] = list()
+    for _ in range(count):
+        length, = MESSAGE_LENGTH.unpack_from(xbytes, offset)
+        offset += MESSAGE_LENGTH.size
+        if length < 0:
+            messages.append(None)
+        else:
+            messages.append(bytes(view[offset:offset+length]))
+            offset += length
+    return messages
+
+
+def frame_overhead(strings: List[str]) -> int:
+    """Number of bytes of a frame besides its payload."""
+    return FRAME_HEADER.size + STRING_LENGTH.size * (1 + len(strings)) + \
+        sum(len(string.encode("utf-8")) for string in strings)
+
+
+def encode_frame(request_id: int, code: int, strings: List[str], payload: bytes = b"") -> bytes:
+    """Encode a frame of the stream transport, with some strings (e.g. IDs) and a binary payload."""
+    parts = [b"", STRING_LENGTH.pack(len(strings))]
+    for string in strings:
+        data = string.encode("utf-8")
+        parts += [STRING_LENGTH.pack(len(data)), data]
+    parts.append(payload)
+    length = sum(map(len, parts)) + FRAME_HEADER.size - 4
+    parts[0] = FRAME_HEADER.pack(length, request_id, code)
+    return b"".join(parts)
+
+
+def read_frame(stream) -> Optional[Tuple[int, int, List[str], bytes]]:
+    """
+    Read a frame from a binary file (e.g. made from a socket).
+
+    Returns:
+        Optional[Tuple[int, int, List[str], bytes]]: The request ID, code, strings and payload of
+            the frame, or None at the end of the stream
+
+    Raises:
+        ValueError: If the stream ends within a frame, or the frame is malformed
+    """
+    header = stream.read(FRAME_HEADER.size)
+    if not header:
+        return None
+    if len(header) < FRAME_HEADER.size:
+        raise ValueError("Stream ended within a frame header")
+    length, request_id, code = FRAME_HEADER.unpack(header)
+    bodyLength = length + 4 - FRAME_HEADER.size
+    body = stream.read(bodyLength) if bodyLength > 0 else b""
+    if len(body) < max(bodyLength, STRING_LENGTH.size):
+        raise ValueError("Stream ended within a frame")
+    count, = STRING_LENGTH.unpack_from(body)
+    offset = STRING_LENGTH.size
+    strings = list()
+    for _ in range(count):
+        if offset + STRING_LENGTH.size > len(body):
+            raise ValueError("Frame too short for its strings")
+        size, = STRING_LENGTH.unpack_from(body, offset)
+        offset += STRING_LENGTH.size
+        if offset + size > len(body):
+            raise ValueError("Frame too short for its strings")
+        strings.append(body[offset:offset+size].decode("utf-8"))
+        offset += size
+    return request_id, code, strings, body[offset:]